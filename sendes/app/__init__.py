@@ -14,7 +14,7 @@ def create_app(config_class=Config):
 
     with app.app_context():
         db.create_all()
-        from app.services import dbService
+        from app.services.database import dbService
         dbService.start()
 
     return app
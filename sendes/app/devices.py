@@ -0,0 +1,231 @@
+import threading
+import time
+
+import numpy as np
+from labjack import ljm
+
+
+def sample_waveform(x: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Given times in seconds, returns noise free AIN0 (P1), AIN1 (P2) and AIN2 (x) voltages
+    of a 2.5 s sample test: valve opens at 0.5 s, piston travels from 0.5 s to 2 s
+    """
+    ain0, ain1, ain2 = np.ones_like(x), np.ones_like(x), np.ones_like(x)
+    # ain0 = P1
+    ain0[:] = 0.9451
+    # ain1 = P2
+    ain1[(x < 0.5)] = 0.9451
+    ain1[(x >= 0.5) & (x < 1)] = (
+        -(0.9451 - 0.471) / 0.5 * x[(x >= 0.5) & (x < 1)] + 0.9451 + 0.9451 - 0.47
+    )
+    ain1[(x >= 1) & (x < 2)] = 0.47
+    ain1[(x >= 2)] = (0.9451 - 0.471) / 0.5 * x[(x >= 2)] - 1.4253
+    # ain2 = x
+    ain2[(x < 0.5)] = 0.2
+    ain2[(x >= 0.5) & (x < 2)] = x[(x >= 0.5) & (x < 2)] * 0.368 + 0.016
+    ain2[(x >= 2)] = 2 * 0.368 + 0.016
+    return ain0, ain1, ain2
+
+
+class SimulatedT7:
+    """
+    Stands in for the labjack.ljm calls used by the app with a simulated T7
+
+    Scans are synthetic (sample_waveform plus noise on AIN0-AIN2, noise elsewhere, repeating
+    every 2.5 s) or replayed from a stored test given as {channel name: voltages}, and are produced at the stream scan rate unless max_speed is set.
+    Reads that fall behind build up an LJM backlog, once it exceeds ljm_buffer_scans the
+    oldest scans are dropped and reported as -9999 like the LJM auto-recovery does.
+    skip_rate is the chance per read of injecting an extra burst of -9999 scans.
+    """
+
+    DEVICE_TYPE = ljm.constants.dtT7
+    CONNECTION_TYPE = ljm.constants.ctUSB
+    SERIAL_NUMBER = 470000000
+    NOISE = {"AIN0": 0.007120869, "AIN1": 0.007436709, "AIN2": 6.08881e-5}
+
+    def __init__(
+        self,
+        replay: dict[str, np.ndarray] = None,
+        max_speed: bool = False,
+        skip_rate: float = 0.0,
+        ljm_buffer_scans: int = 100000,
+        seed: int = None,
+    ):
+        self.replay = replay
+        self.max_speed = max_speed
+        self.skip_rate = skip_rate
+        self.ljm_buffer_scans = ljm_buffer_scans
+        self.rng = np.random.default_rng(seed)
+        self.handles = {}
+        self.next_handle = 1
+
+    def _device(self, handle: int) -> dict:
+        if handle not in self.handles:
+            raise ljm.LJMError(errorString=f"Simulated handle {handle} is not open")
+        return self.handles[handle]
+
+    def openS(self, deviceType="ANY", connectionType="ANY", identifier="ANY") -> int:
+        handle = self.next_handle
+        self.next_handle += 1
+        self.handles[handle] = {"registers": {}, "stream": None}
+        return handle
+
+    def getHandleInfo(self, handle: int) -> tuple:
+        self._device(handle)
+        return (self.DEVICE_TYPE, self.CONNECTION_TYPE, self.SERIAL_NUMBER, 0, 0, 1040)
+
+    def namesToAddresses(self, numFrames: int, aNames: list[str]) -> tuple[list, list]:
+        addresses = []
+        for name in aNames[:numFrames]:
+            if not name.startswith("AIN") or not name[3:].isdigit():
+                raise ljm.LJMError(errorString=f"Simulated T7 cannot stream {name}")
+            addresses.append(int(name[3:]) * 2)
+        return addresses, [ljm.constants.FLOAT32] * len(addresses)
+
+    def eWriteName(self, handle: int, name: str, value: float) -> None:
+        self._device(handle)["registers"][name] = value
+
+    def eWriteNames(self, handle: int, numFrames: int, aNames, aValues) -> None:
+        for name, value in list(zip(aNames, aValues))[:numFrames]:
+            self.eWriteName(handle, name, value)
+
+    def eReadName(self, handle: int, name: str) -> float:
+        if name == "SERIAL_NUMBER":
+            self._device(handle)
+            return self.SERIAL_NUMBER
+        return self._device(handle)["registers"].get(name, 0)
+
+    def eStreamStart(
+        self, handle: int, scansPerRead: int, numAddresses: int, aScanList, scanRate
+    ) -> float:
+        device = self._device(handle)
+        if device["stream"] is not None:
+            raise ljm.LJMError(errorString="Simulated stream is already running")
+        device["stream"] = {
+            "channels": [f"AIN{a // 2}" for a in aScanList[:numAddresses]],
+            "scans_per_read": scansPerRead,
+            "scan_rate": float(scanRate),
+            "started": time.perf_counter(),
+            "consumed": 0,
+        }
+        return float(scanRate)
+
+    def _scans(self, channels: list[str], first: int, count: int, rate: float) -> np.ndarray:
+        """Returns (count, channels) voltages for scans first..first+count"""
+        index = np.arange(first, first + count)
+        if self.replay:
+            length = len(next(iter(self.replay.values())))
+            index %= max(length, 1)
+            return np.column_stack(
+                [
+                    self.replay[ch][index] if ch in self.replay else np.zeros(count)
+                    for ch in channels
+                ]
+            )
+        waves = dict(zip(["AIN0", "AIN1", "AIN2"], sample_waveform(index / rate % 2.5)))
+        return np.column_stack(
+            [
+                self.rng.normal(waves.get(ch, np.zeros(count)), self.NOISE.get(ch, 1e-3))
+                for ch in channels
+            ]
+        )
+
+    def eStreamRead(self, handle: int) -> tuple[list, int, int]:
+        stream = self._device(handle)["stream"]
+        if stream is None:
+            raise ljm.LJMError(errorString="Simulated stream is not running")
+        spr, rate = stream["scans_per_read"], stream["scan_rate"]
+
+        if self.max_speed:
+            backlog = 0
+        else:
+            available = int((time.perf_counter() - stream["started"]) * rate)
+            available -= stream["consumed"]
+            if available < spr:
+                time.sleep((spr - available) / rate)
+                available = spr
+            backlog = available - spr
+
+        # scans lost to an LJM buffer overflow, reported as -9999 at the start of the read
+        lost = 0
+        if backlog > self.ljm_buffer_scans:
+            lost = backlog - self.ljm_buffer_scans
+            stream["consumed"] += lost
+            backlog = self.ljm_buffer_scans
+        scans = self._scans(stream["channels"], stream["consumed"], spr, rate)
+        scans[: min(lost, spr)] = -9999.0
+        if self.skip_rate and self.rng.random() < self.skip_rate:
+            burst = self.rng.integers(1, spr + 1)
+            at = self.rng.integers(0, spr - burst + 1)
+            scans[at : at + burst] = -9999.0
+        stream["consumed"] += spr
+
+        device_backlog = 0 if lost == 0 else spr
+        return scans.ravel().tolist(), device_backlog, backlog
+
+    def eStreamStop(self, handle: int) -> None:
+        device = self._device(handle)
+        if device["stream"] is None:
+            raise ljm.LJMError(errorString="Simulated stream is not running")
+        device["stream"] = None
+
+    def close(self, handle: int) -> None:
+        self.handles.pop(handle, None)
+
+
+class DeviceSession:
+    """
+    Keeps one device handle open across tests and config validations
+
+    The handle is health checked before each use and reopened when stale. Scan list
+    addresses are resolved once per scan list and registers are only written when their
+    value differs from the last write on the current handle. Hold lock while streaming.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.lock = threading.RLock()
+        self.handle = None
+        self.info = None
+        self.addresses = {}
+        self.registers = {}
+
+    def open(self) -> int:
+        """Returns the open handle, reopening the device if the handle no longer responds"""
+        if self.handle is not None:
+            try:
+                self.device.eReadName(self.handle, "SERIAL_NUMBER")
+                return self.handle
+            except ljm.LJMError:
+                self.close()
+        self.handle = self.device.openS()
+        self.info = self.device.getHandleInfo(self.handle)
+        return self.handle
+
+    def scan_list(self, names: list[str]) -> list[int]:
+        """Returns the stream addresses of the given channel names"""
+        key = tuple(names)
+        if key not in self.addresses:
+            self.addresses[key] = self.device.namesToAddresses(len(names), list(names))[0]
+        return self.addresses[key]
+
+    def configure(self, registers: dict) -> int:
+        """Writes the registers that changed since the last write, returns how many were written"""
+        changed = {k: v for k, v in registers.items() if self.registers.get(k) != v}
+        if changed:
+            self.device.eWriteNames(
+                self.handle, len(changed), list(changed.keys()), list(changed.values())
+            )
+            self.registers.update(changed)
+        return len(changed)
+
+    def close(self) -> None:
+        """Closes the handle, the next open reopens the device and rewrites every register"""
+        if self.handle is not None:
+            try:
+                self.device.close(self.handle)
+            except ljm.LJMError:
+                pass
+        self.handle = None
+        self.info = None
+        self.registers = {}
@@ -1,6 +1,17 @@
 from flask_wtf import FlaskForm
-from wtforms import IntegerField, SelectField, FloatField, SubmitField, HiddenField
-from wtforms.validators import DataRequired, NumberRange, AnyOf
+from wtforms import (
+    Form,
+    IntegerField,
+    SelectField,
+    FloatField,
+    StringField,
+    SubmitField,
+    HiddenField,
+    BooleanField,
+    FieldList,
+    FormField,
+)
+from wtforms.validators import DataRequired, NumberRange, AnyOf, Optional, Regexp, ValidationError
 
 
 class ConstantsForm(FlaskForm):
@@ -19,6 +30,16 @@ class ConstantsForm(FlaskForm):
     submit = SubmitField("Save Constants")
 
 
+class ChannelForm(Form):
+    name = StringField(
+        "Channel", validators=[Optional(), Regexp(r"^AIN\d+$", message="Use AIN0, AIN1, ...")]
+    )
+    range = SelectField(
+        "Range (+/- V)", choices=[10.0, 1.0, 0.1, 0.01], coerce=float, default=10.0
+    )
+    role = StringField("Role")
+
+
 class LjconfigForm(FlaskForm):
     scan_rate = IntegerField("Scan Rate", default=267)
     read_count = IntegerField("Test Duration in .5s Increments", default=10)
@@ -26,8 +47,29 @@ class LjconfigForm(FlaskForm):
     stream_resolution_index = IntegerField(
         "Noise Reduction", validators=[NumberRange(min=0, max=8)], default=8
     )
+    autotune = BooleanField("Find Max Sustainable Scan Rate")
+    # rows without a channel name are left out of the scan list
+    channel_list = FieldList(
+        FormField(ChannelForm),
+        min_entries=8,
+        default=[
+            {"name": "AIN0", "range": 10.0, "role": "p1"},
+            {"name": "AIN1", "range": 1.0, "role": "p2"},
+            {"name": "AIN2", "range": 1.0, "role": "x"},
+        ],
+    )
     submit = SubmitField("Save and Validate LJConfig")
 
+    def validate_channel_list(self, field):
+        rows = [row for row in field.data if row["name"]]
+        names = [row["name"] for row in rows]
+        roles = [row["role"] for row in rows]
+        if len(set(names)) != len(names):
+            raise ValidationError("Each channel can only be scanned once")
+        for role in ("p1", "p2", "x"):
+            if roles.count(role) != 1:
+                raise ValidationError(f"Exactly one channel needs the {role} role")
+
 
 class TestBoundForm(FlaskForm):
     window_start = IntegerField("Window Start")
@@ -0,0 +1,185 @@
+import numpy as np
+
+from app.extensions import ur
+
+# unit factors, evaluated once with pint
+INCH = (1 * ur.inch).to("m").magnitude
+PSI = (1 * ur.psi).to("Pa").magnitude
+# ResultService.v2p: 4-20 mA transducer read across 20 * 5.9 ohm, 200 psi per 16 mA
+V2P_SLOPE = 200 / 0.016 / (20 * 5.9)  # psi per volt, before calibration
+V2P_OFFSET = -0.004 * 200 / 0.016  # psi, before calibration
+# ResultService.v2l: potentiometer inches per volt
+V2L = 7.853
+
+# Cd inputs in the units of cd_dict: inches, kg/m3, volts and seconds
+VARIABLES = ("d", "d1", "d2", "rho", "vdx", "dt", "vp1", "vp2")
+
+
+def dt_uncertainty(sample_period):
+    """Sample period uncertainty of the T7 stream clock"""
+    return (sample_period * 267) ** (1 / 2) * 1.6552e-8
+
+
+def upc_umf(partials, x, u, cd, u_cd) -> tuple[np.ndarray, np.ndarray]:
+    """Given partials and inputs (..., len(VARIABLES)) and Cd (...), returns UPC and UMF"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        upc = (partials * u / u_cd[..., None]) ** 2
+        umf = partials * x / cd[..., None]
+    return upc, umf
+
+
+def cd_propagate(x: np.ndarray, u: np.ndarray, calibration: np.ndarray) -> dict:
+    """
+    Linear uncertainty propagation of Cd for any number of tests or parameter sets at once
+
+    Given inputs x and standard uncertainties u, (..., len(VARIABLES)) arrays in VARIABLES order,
+    and transducer calibrations (..., 4) as p1_slope, p1_offset, p2_slope, p2_offset,
+    returns cd, u_cd and, per variable, the partial derivative of Cd (input units), the
+    uncertainty percentage contribution UPC = (dCd/dx * ux / ucd) ** 2 and the uncertainty
+    magnification factor UMF = dCd/dx * x / cd, in the same order
+
+    Cd = d**2 dx / (dt d2**2) * (rho (1 - beta**4) / (2 (p1 - p2))) ** 0.5, beta = d2 / d1
+    Partials are closed form, from d ln Cd for each input, so no derivative bookkeeping
+    """
+    x, u, calibration = np.asarray(x, float), np.asarray(u, float), np.asarray(calibration, float)
+    d_in, d1_in, d2_in, rho, vdx, dt, vp1, vp2 = np.moveaxis(x, -1, 0)
+    p1_slope, p1_offset, p2_slope, p2_offset = np.moveaxis(calibration, -1, 0)
+
+    d, d1, d2 = d_in * INCH, d1_in * INCH, d2_in * INCH
+    dx = vdx * V2L * INCH
+    p1 = ((vp1 * V2P_SLOPE + V2P_OFFSET) * p1_slope + p1_offset) * PSI
+    p2 = ((vp2 * V2P_SLOPE + V2P_OFFSET) * p2_slope + p2_offset) * PSI
+    dp = p1 - p2
+    beta4 = (d2 / d1) ** 4
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = rho * (1 - beta4) / (2 * dp)
+        cd = d**2 * dx / (dt * d2**2) * np.sqrt(ratio)
+        partials = np.stack(
+            [
+                2 * cd / d_in,
+                2 * cd * beta4 / (d1_in * (1 - beta4)),
+                -2 * cd / (d2_in * (1 - beta4)),
+                cd / (2 * rho),
+                cd / vdx,
+                -cd / dt,
+                -cd / (2 * dp) * V2P_SLOPE * p1_slope * PSI,
+                cd / (2 * dp) * V2P_SLOPE * p2_slope * PSI,
+            ],
+            axis=-1,
+        )
+        u_cd = np.sqrt(np.sum((partials * u) ** 2, axis=-1))
+    upc, umf = upc_umf(partials, x, u, cd, u_cd)
+    return {
+        "cd": cd,
+        "u_cd": u_cd,
+        "partials": partials,
+        "upc": upc,
+        "umf": umf,
+        # negative square root argument, the ufloat calculation raises for these
+        "invalid": ratio < 0,
+    }
+
+
+def cd_value(x: np.ndarray, calibration: np.ndarray) -> np.ndarray:
+    """Cd of inputs x (..., len(VARIABLES)) and calibrations (..., 4), NaN where undefined"""
+    d_in, d1_in, d2_in, rho, vdx, dt, vp1, vp2 = np.moveaxis(np.asarray(x, float), -1, 0)
+    p1_slope, p1_offset, p2_slope, p2_offset = np.moveaxis(np.asarray(calibration, float), -1, 0)
+    dx = vdx * V2L * INCH
+    p1 = ((vp1 * V2P_SLOPE + V2P_OFFSET) * p1_slope + p1_offset) * PSI
+    p2 = ((vp2 * V2P_SLOPE + V2P_OFFSET) * p2_slope + p2_offset) * PSI
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta4 = (d2_in / d1_in) ** 4
+        return (
+            (d_in * INCH) ** 2 * dx / (dt * (d2_in * INCH) ** 2)
+            * np.sqrt(rho * (1 - beta4) / (2 * (p1 - p2)))
+        )
+
+
+def cd_samples(x, u, calibration, count: int, seed) -> np.ndarray:
+    """
+    Given one test's inputs, uncertainties and calibration, returns the Cd of count draws
+    of normally distributed inputs, seed is anything np.random.default_rng accepts
+    """
+    rng = np.random.default_rng(seed)
+    draws = rng.normal(x, u, size=(count, len(VARIABLES)))
+    return cd_value(draws, calibration)
+
+
+
+def prefix_sums(values, out: tuple = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Prefix sums along the first axis of values and of their squares, centered so the sums of
+    squares do not cancel out, for segment_stats
+    Written into out = (shift, sums, squares) when given, such as the arrays of a StatsIndex
+    """
+    values = np.asarray(values, float)
+    if out is None:
+        rows = (len(values) + 1,) + values.shape[1:]
+        out = np.empty(values.shape[1:]), np.empty(rows), np.empty(rows)
+    shift, sums, squares = out
+    shift[...] = values.mean(axis=0) if len(values) else 0
+    centered = values - shift
+    sums[0] = squares[0] = 0
+    np.cumsum(centered, axis=0, out=sums[1:])
+    np.cumsum(centered * centered, axis=0, out=squares[1:])
+    return shift, sums, squares
+
+
+def segment_stats(prefix: tuple, start, finish) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Given prefix_sums of values and arrays of segment starts and finishes (exclusive), returns
+    the mean and standard deviation of every values[start:finish], each in constant time
+    NaN for empty segments, single values have no spread, without the round-off of the sums
+    """
+    shift, sums, squares = prefix
+    start, finish = np.asarray(start), np.asarray(finish)
+    count = (finish - start).reshape(start.shape + (1,) * (sums.ndim - 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (sums[finish] - sums[start]) / count
+        var = (squares[finish] - squares[start]) / count - mean**2
+    return mean + shift, np.where(count == 1, 0, np.sqrt(np.maximum(var, 0)))
+
+
+def steady_window(
+    dp, dx, count: int, noise_width: int, grid: int, min_length: int, min_confidence: float
+) -> tuple[int, int, float]:
+    """
+    Finds the longest steady flow segment of a test of count scans, given the prefix_sums of
+    its pressure difference and of the count - 1 differences of its position channel, such as
+    columns of its StatsIndex
+    Every segment between grid + 1 evenly spaced scans is scored at once, each in constant
+    time: its confidence is the smallest share of the dp and dx variance over the segment that
+    is noise, the noise being the median standard deviation over noise_width windows
+    A segment qualifies when it is at least min_length scans, its confidence is at least
+    min_confidence and the piston moves at over half its top speed
+    Returns start, finish (exclusive) and confidence of the longest qualifying segment, the
+    most confident of equal ones, or None when no segment qualifies
+    """
+    if count < max(min_length, noise_width + 1, 2):
+        return None
+    # every noise window, two sums apiece, dx holds one value less than dp
+    noise = np.arange(count - noise_width + 1)
+    floor_dp = np.median(segment_stats(dp, noise, noise + noise_width)[1])
+    speed, speed_std = segment_stats(dx, noise[:-1], noise[:-1] + noise_width)
+    floor_dx = np.median(speed_std)
+    top_speed = np.percentile(speed, 95)
+
+    points = np.unique(np.linspace(0, count, grid + 1).astype(int))
+    start, finish = np.meshgrid(points, points, indexing="ij")
+    candidate = finish - start >= max(min_length, 2)
+    start, finish = start[candidate], finish[candidate]
+    mean_dp, std_dp = segment_stats(dp, start, finish)
+    # a segment of scans start to finish holds differences start to finish - 1
+    mean_dx, std_dx = segment_stats(dx, start, finish - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        confidence = np.minimum((floor_dp / std_dp) ** 2, (floor_dx / std_dx) ** 2)
+    confidence = np.clip(np.nan_to_num(confidence, nan=1.0), 0, 1)
+
+    steady = (confidence >= min_confidence) & (mean_dx > 0.5 * top_speed) & (top_speed > 0)
+    if not steady.any():
+        return None
+    best = np.flatnonzero(steady)[
+        np.lexsort((confidence[steady], (finish - start)[steady]))[-1]
+    ]
+    return int(start[best]), int(finish[best]), float(confidence[best])
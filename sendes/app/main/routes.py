@@ -1,18 +1,28 @@
 from app.main import bp
-from app.extensions import db
+from app import kernels
+from app.extensions import db, console
 from app.forms import ConstantsForm, LjconfigForm, TestBoundForm
-from app.services import ConstantsService, LjconfigService, TestService, ResultService
+from app.services.constants import ConstantsService
+from app.services.database import dbService
+from app.services.ljconfig import LjconfigService
+from app.services.pools import RenderService
+from app.services.results import ResultService
+from app.services.stats import StatsService, PyramidService
+from app.services.stream import TestService, SpoolService, LiveFeed
 from app.models import Constants, Ljconfig, Test
 
 from flask import (
     render_template,
+    flash,
     redirect,
     url_for,
     send_from_directory,
     request,
     current_app,
+    Response,
 )
 import json
+import numpy as np
 from sqlalchemy import select
 
 
@@ -39,11 +49,20 @@ def add_constant():
     constants_form = ConstantsForm()
     if constants_form.validate_on_submit():
         constants_entry = ConstantsService.create(constants_form)
-        return redirect(
-            url_for("main.activate_constant", constants_id=constants_entry.id), code=307
-        )
-    else:
-        return render_template("constants_add.html", constants_form=constants_form)
+        if constants_entry is not None:
+            return redirect(
+                url_for("main.activate_constant", constants_id=constants_entry.id), code=307
+            )
+    return render_template("constants_add.html", constants_form=constants_form)
+
+
+@bp.route("/constants/reanalyze", methods=["POST"])
+@bp.route("/constants/reanalyze/<int:constants_id>", methods=["POST"])
+def reanalyze_constants(constants_id=None):
+    # every analyzed test against one constants set, or all of them
+    report = ResultService.reanalyze(None if constants_id is None else [constants_id])
+    constants = db.session.execute(select(Constants)).scalars()
+    return render_template("constants.html", constants=constants, report=report)
 
 
 @bp.route("/constants/activate/<int:constants_id>", methods=["POST"])
@@ -61,7 +80,12 @@ def get_ljconfigs():
 @bp.route("/ljconfig/add", methods=["GET"])
 def ljconfig_form():
     ljconfig_form = LjconfigForm()
-    return render_template("ljconfig_add.html", ljconfig_form=ljconfig_form)
+    return render_template(
+        "ljconfig_add.html",
+        ljconfig_form=ljconfig_form,
+        plan=ResultService.plan(),
+        variables=kernels.VARIABLES,
+    )
 
 
 @bp.route("/ljconfig/add", methods=["POST"])
@@ -69,11 +93,33 @@ def add_ljconfig():
     ljconfig_form = LjconfigForm()
     if ljconfig_form.validate_on_submit():
         ljconfig_entry = LjconfigService.create(ljconfig_form)
-        return redirect(
-            url_for("main.activate_ljconfig", ljconfig_id=ljconfig_entry.id), code=307
-        )
-    else:
-        return render_template("ljconfig_add.html", ljconfig_form=ljconfig_form)
+        if ljconfig_entry is not None:
+            return redirect(
+                url_for("main.activate_ljconfig", ljconfig_id=ljconfig_entry.id), code=307
+            )
+    return render_template(
+        "ljconfig_add.html",
+        ljconfig_form=ljconfig_form,
+        plan=ResultService.plan(),
+        variables=kernels.VARIABLES,
+    )
+
+
+@bp.route("/ljconfig/plan", methods=["GET"])
+def plan_ljconfig():
+    # predicted Cd uncertainty over a scan rate grid, or at the given scan_rate values
+    rates = request.args.getlist("scan_rate", type=float)
+    plan = ResultService.plan(np.array(rates) if rates else None)
+    if plan is None:
+        return {"error": "no active constants"}, 404
+    return {
+        "scan_rates": plan["scan_rates"].tolist(),
+        "cd": plan["cd"].tolist(),
+        "u_cd": plan["u_cd"].tolist(),
+        "u_rel": plan["u_rel"].tolist(),
+        "upc": dict(zip(kernels.VARIABLES, plan["upc"].T.tolist())),
+        "reference": plan["reference"],
+    }
 
 
 @bp.route("/ljconfig/activate/<int:ljconfig_id>", methods=["POST"])
@@ -85,14 +131,26 @@ def activate_ljconfig(ljconfig_id):
 @bp.route("/test", methods=["GET"])
 def get_tests():
     # display list of tests, with buttons to view result or view test
-    tests_gen = db.session.execute(select(Test)).scalars()
-    test_dict = {}
-    tests_list = []
-    for test in tests_gen:
-        tests_list.append(test)
-        r = ResultService.analyze(test.id)
-        test_dict[test.id] = [r['cd'][0], r['vdx'][-2], r['vp1'][-1], r['vp2'][-1], r['vdx'][-1]] if not isinstance(r, Exception) else ["N/A"]*5
-    return render_template("tests.html", tests=tests_list, test_dict=test_dict)
+    # served from the result table, keyset paginated by the chosen sort column
+    sort = request.args.get("sort", "date")
+    if sort not in ResultService.SORTS:
+        sort = "date"
+    order = "asc" if request.args.get("order") == "asc" else "desc"
+    rows, after = ResultService.listing(
+        sort,
+        order == "desc",
+        request.args.get("after"),
+        current_app.config["TESTS_PAGE_SIZE"],
+    )
+    return render_template(
+        "tests.html",
+        rows=rows,
+        sort=sort,
+        order=order,
+        after=after,
+        first_page=not request.args.get("after"),
+        ufmt=ResultService.format,
+    )
 
 
 @bp.route("/test", methods=["POST"])
@@ -101,13 +159,31 @@ def execute_test():
         return redirect(url_for("main.get_tests"))
     current_app.config["TESTING"] = True
     test_entry = TestService.execute(live=True)
-    db.session.add(test_entry)
-    db.session.commit()
+    if isinstance(test_entry, Exception):
+        # keep whatever was streamed before the error
+        SpoolService.recover()
+        ResultService.warm()
+        current_app.config["TESTING"] = False
+        return redirect(url_for("main.get_tests"))
+    dbService.save_test(test_entry)
     test_entry = TestService.analyze(test_entry)
+    ResultService.warm(test_entry.id)
     current_app.config["TESTING"] = False
     return redirect(url_for("main.get_test", test_id=test_entry.id))
 
 
+@bp.route("/test/live", methods=["GET"])
+def live_test():
+    # server-sent events of the running test, min/max decimated per stream read
+    return Response(
+        LiveFeed.events(
+            current_app.config["LIVE_CLIENT_BUFFER"], current_app.config["LIVE_FRAME_POINTS"]
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @bp.route("/test/<int:test_id>", methods=["GET"])
 def get_test(test_id):
     bound_form = TestBoundForm()
@@ -115,13 +191,51 @@ def get_test(test_id):
     if test is not None:
         bound_form.window_start.data = test.window_start
         bound_form.window_finish.data = test.window_finish
-        images = TestService.get_images(test)
         return render_template(
-            "test.html", test=test, images=images, bound_form=bound_form
+            "test.html",
+            test=test,
+            bound_form=bound_form,
+            channel_stats=StatsService.summary(test.id),
         )
     return redirect(url_for("main.get_tests"))
 
 
+@bp.route("/test/<int:test_id>/data", methods=["GET"])
+def get_test_data(test_id):
+    # min/max decimated scans of a time range, at the pyramid level matching points
+    test = db.session.get(Test, test_id)
+    if test is None:
+        return {"error": "no such test"}, 404
+    meta, view = PyramidService.data(
+        test,
+        request.args.get("start", 0, type=int),
+        request.args.get("finish", type=int),
+        request.args.get("points", type=int),
+    )
+    as_list = lambda a: [None if v != v else v for v in a.tolist()]
+    return {
+        **meta,
+        "index": view["index"].tolist(),
+        "min": [as_list(c) for c in view["min"].T],
+        "max": [as_list(c) for c in view["max"].T],
+    }
+
+
+@bp.route("/test/<int:test_id>/data.f32", methods=["GET"])
+def get_test_data_binary(test_id):
+    # the same view as /test/<id>/data packed as float32 for the test page chart
+    test = db.session.get(Test, test_id)
+    if test is None:
+        return {"error": "no such test"}, 404
+    meta, view = PyramidService.data(
+        test,
+        request.args.get("start", 0, type=int),
+        request.args.get("finish", type=int),
+        request.args.get("points", type=int),
+    )
+    return Response(PyramidService.packed(meta, view), mimetype="application/octet-stream")
+
+
 @bp.route("/test/set/<int:test_id>", methods=["POST"])
 def set_test_bound(test_id):
     referrer = request.referrer
@@ -129,22 +243,64 @@ def set_test_bound(test_id):
         bound_form = TestBoundForm()
         if bound_form.validate_on_submit():
             TestService.set_bounds(bound_form, test_id)
+            ResultService.warm(test_id)
         return redirect(referrer)
     else:
         return redirect(url_for("main.index"))
 
 
+@bp.route("/test/window/<int:test_id>", methods=["POST"])
+def find_test_window(test_id):
+    # reset the window to the detected steady flow window
+    test_entry = db.session.get(Test, test_id)
+    TestService.analyze(test_entry, find_window=True)
+    ResultService.warm(test_id)
+    return redirect(url_for("main.get_test", test_id=test_id))
+
+
 @bp.route("/result/<int:test_id>", methods=["GET"])
 def get_result(test_id):
     cd_dict = ResultService.analyze(test_id)
     if isinstance(cd_dict, dict):
         image = ResultService.get_images(cd_dict, test_id)
-        return render_template("result.html", cd_dict=cd_dict, image=image, test_id=test_id)
+        series = ResultService.series(
+            test_id,
+            width=request.args.get("width", type=int),
+            stride=request.args.get("stride", type=int),
+        )
+        if not isinstance(series, dict):
+            flash(str(series))
+            return redirect(url_for("main.get_result", test_id=test_id))
+        series_image = ResultService.series_image(test_id, series)
+        # Monte Carlo uncertainty on request, shown beside the linear propagation
+        monte_carlo = monte_carlo_error = None
+        if request.args.get("monte_carlo"):
+            monte_carlo = ResultService.monte_carlo(test_id, seed=request.args.get("seed", type=int))
+            if not isinstance(monte_carlo, dict):
+                console.print(
+                    f"Monte Carlo of test {test_id} failed: {monte_carlo!r}", style="orange_red1"
+                )
+                monte_carlo, monte_carlo_error = None, str(monte_carlo)
+        return render_template(
+            "result.html",
+            cd_dict=cd_dict,
+            image=image,
+            series_image=series_image,
+            test_id=test_id,
+            monte_carlo=monte_carlo,
+            monte_carlo_error=monte_carlo_error,
+        )
     else:
-        print(cd_dict)
+        console.print(f"Test {test_id} could not be analyzed: {cd_dict}", style="orange_red1")
         return redirect(url_for("main.get_test", test_id=test_id))
 
 
+@bp.route("/render/stats", methods=["GET"])
+def get_render_stats():
+    # latency of recent plot renders and how many requests joined a running render
+    return RenderService.stats()
+
+
 @bp.route("/favicon.ico")
 def favicon():
     return send_from_directory(
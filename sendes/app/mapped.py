@@ -0,0 +1,84 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+
+class MappedFile:
+    """
+    Base of the memory-mapped file formats: a HEADER_SIZE byte header starting with MAGIC,
+    then the arrays of the format viewed on the same buffer. Without a path the buffer lives
+    in memory only
+
+    Files that are only read once complete are staged: written to path + ".part" and
+    renamed by publish, so a crash never leaves a partial file behind
+    """
+
+    MAGIC = b""
+    HEADER_SIZE = 4096
+
+    def __init__(self, path: str, buffer: np.ndarray):
+        self.path = path
+        self.buffer = buffer
+
+    @classmethod
+    def allocate(cls, path: str, size: int, staged: bool = True) -> np.ndarray:
+        """Returns a zeroed buffer of size bytes starting with MAGIC"""
+        if path is None:
+            buffer = np.zeros(size, dtype=np.uint8)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            target = path + ".part" if staged else path
+            buffer = np.memmap(target, dtype=np.uint8, mode="w+", shape=(size,))
+        buffer[:4] = np.frombuffer(cls.MAGIC, dtype=np.uint8)
+        return buffer
+
+    @classmethod
+    def map(cls, path: str, mode: str = "r") -> np.ndarray:
+        """Maps an existing file, checking its magic"""
+        buffer = np.memmap(path, dtype=np.uint8, mode=mode)
+        if bytes(buffer[:4]) != cls.MAGIC:
+            raise ValueError(f"{path} is not a {cls.__name__} file")
+        return buffer
+
+    @classmethod
+    def encode(cls, value, offset: int, limit: int = None) -> bytes:
+        """JSON of value, raises ValueError unless its length and it fit from offset to limit"""
+        data = json.dumps(value).encode()
+        if offset + 4 + len(data) > (limit or cls.HEADER_SIZE):
+            raise ValueError(f"{cls.__name__} metadata does not fit in the header")
+        return data
+
+    @staticmethod
+    def write_json(buffer: np.ndarray, offset: int, data: bytes) -> None:
+        """Writes encoded JSON after its uint32 length at offset"""
+        buffer[offset + 4 : offset + 4 + len(data)] = np.frombuffer(data, dtype=np.uint8)
+        struct.pack_into("<I", buffer, offset, len(data))
+
+    @staticmethod
+    def read_json(buffer: np.ndarray, offset: int):
+        (length,) = struct.unpack_from("<I", buffer, offset)
+        return json.loads(bytes(buffer[offset + 4 : offset + 4 + length]))
+
+    def flush(self) -> None:
+        if isinstance(self.buffer, np.memmap):
+            self.buffer.flush()
+
+    def sync(self, offset: int, size: int) -> None:
+        """Writes bytes offset to offset + size of a mapped file through to the disk (msync)"""
+        if isinstance(self.buffer, np.memmap) and size > 0:
+            start = offset - offset % mmap.PAGESIZE
+            self.buffer.base.flush(start, offset + size - start)
+
+    def publish(self) -> None:
+        """Moves a staged file into place once complete"""
+        if self.path is not None:
+            self.flush()
+            os.replace(self.path + ".part", self.path)
+
+    def delete(self) -> None:
+        """Removes the file, views of its arrays stay readable until released"""
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
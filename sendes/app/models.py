@@ -1,3 +1,5 @@
+from typing import Optional
+
 from app.extensions import db
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -50,6 +52,13 @@ class Ljconfig(db.Model):
     is_active: Mapped[bool] = mapped_column(db.Boolean)
     is_valid: Mapped[bool] = mapped_column(db.Boolean)
     error_message: Mapped[str] = mapped_column(db.String)
+    # autotuned configs: how much faster than scan_rate the first failing probe was, as a fraction
+    headroom: Mapped[Optional[float]] = mapped_column(db.Float)
+    # channel signature (see ChannelService.signature), part of the config's identity
+    scan_list: Mapped[Optional[str]] = mapped_column(db.String)
+    channels: Mapped[list["Channel"]] = relationship(
+        order_by="Channel.position", cascade="all, delete-orphan"
+    )
     tests: Mapped[list["Test"]] = relationship()
 
     __table_args__ = (
@@ -57,11 +66,25 @@ class Ljconfig(db.Model):
             "scan_rate",
             "stream_settling_us",
             "stream_resolution_index",
+            "scan_list",
             name="uq_ljconfig",
         ),
     )
 
 
+class Channel(db.Model):
+    id: Mapped[int] = mapped_column(db.Integer, primary_key=True)
+    # order in the stream scan list
+    position: Mapped[int] = mapped_column(db.Integer)
+    # analog input name, e.g. AIN0
+    name: Mapped[str] = mapped_column(db.String)
+    # input range in +/- volts
+    range: Mapped[float] = mapped_column(db.Float)
+    # p1, p2 and x are used by the analysis, anything else is recorded and plotted only
+    role: Mapped[str] = mapped_column(db.String)
+    ljconfig_id: Mapped[int] = mapped_column(db.ForeignKey("ljconfig.id"), index=True)
+
+
 class Test(db.Model):
     id: Mapped[int] = mapped_column(db.Integer, primary_key=True)
     start: Mapped[str] = mapped_column(db.Text)
@@ -73,6 +96,13 @@ class Test(db.Model):
     ufloat_vp1: Mapped[str] = mapped_column(db.String)
     ufloat_vp2: Mapped[str] = mapped_column(db.String)
     ufloat_vdx: Mapped[str] = mapped_column(db.String)
+    # json: reader queue depth and time spent in the read and consume stages
+    acquisition_stats: Mapped[Optional[str]] = mapped_column(db.Text)
+    # steady flow window found by TestService.find_window and its confidence, the share of
+    # the window's pressure difference and piston speed variance that is noise, 0 when none
+    auto_window_start: Mapped[Optional[int]] = mapped_column(db.Integer)
+    auto_window_finish: Mapped[Optional[int]] = mapped_column(db.Integer)
+    window_confidence: Mapped[Optional[float]] = mapped_column(db.Float)
     ljconfig_id: Mapped[int] = mapped_column(db.ForeignKey("ljconfig.id"))
     constants_id: Mapped[int] = mapped_column(db.ForeignKey("constants.id"))
     stream_reads: Mapped[list["StreamRead"]] = relationship()
@@ -81,6 +111,7 @@ class Test(db.Model):
         secondary="stream_read",
         primaryjoin="Test.id==StreamRead.test_id",
         secondaryjoin="StreamRead.id==Scan.stream_read_id",
+        order_by="Scan.sample_i",
         viewonly=True,
     )
 
@@ -91,7 +122,19 @@ class StreamRead(db.Model):
     skipped: Mapped[int] = mapped_column(db.Integer)
     lj_backlog: Mapped[int] = mapped_column(db.Integer)
     ljm_backlog: Mapped[int] = mapped_column(db.Integer)
-    scans: Mapped[list["Scan"]] = relationship()
+    # packed scan block (see ScanService.pack), None for tests stored as Scan rows
+    data: Mapped[Optional[bytes]] = mapped_column(db.LargeBinary)
+    # reads waiting in the reader queue when this read was consumed
+    queue_depth: Mapped[Optional[int]] = mapped_column(db.Integer)
+    # epoch seconds when eStreamRead returned and read/copy duration of the read loop
+    host_time: Mapped[Optional[float]] = mapped_column(db.Float)
+    loop_s: Mapped[Optional[float]] = mapped_column(db.Float)
+    # test-wide index of the read's first scan and its number of scans
+    first_sample: Mapped[Optional[int]] = mapped_column(db.Integer)
+    scan_count: Mapped[Optional[int]] = mapped_column(db.Integer)
+    # Welford count, mean and M2 of every channel over the read, (3, channels) float64
+    stats: Mapped[Optional[bytes]] = mapped_column(db.LargeBinary)
+    scans: Mapped[list["Scan"]] = relationship(order_by="Scan.sample_i")
     test_id: Mapped[int] = mapped_column(db.ForeignKey("test.id"), index=True)
 
 
@@ -100,6 +143,68 @@ class Scan(db.Model):
     ain0: Mapped[float] = mapped_column(db.Float)
     ain1: Mapped[float] = mapped_column(db.Float)
     ain2: Mapped[float] = mapped_column(db.Float)
+    # test-wide scan index
+    sample_i: Mapped[Optional[int]] = mapped_column(db.Integer)
     stream_read_id: Mapped[int] = mapped_column(
         db.ForeignKey("stream_read.id"), index=True
     )
+
+    __table_args__ = (db.Index("ix_scan_read_sample", "stream_read_id", "sample_i"),)
+
+
+class Result(db.Model):
+    id: Mapped[int] = mapped_column(db.Integer, primary_key=True)
+    window_start: Mapped[int] = mapped_column(db.Integer)
+    window_finish: Mapped[int] = mapped_column(db.Integer)
+    # json cd_dict as returned by ResultService.analyze, null when the analysis failed
+    cd_dict: Mapped[str] = mapped_column(db.Text)
+    # test start, copied so the test list can be sorted by date on this table alone
+    start: Mapped[Optional[str]] = mapped_column(db.Text)
+    # Cd, dx (in), P1 and P2 (psi) values and uncertainties, relative uncertainties in %
+    cd: Mapped[Optional[float]] = mapped_column(db.Float)
+    cd_u: Mapped[Optional[float]] = mapped_column(db.Float)
+    cd_rel: Mapped[Optional[float]] = mapped_column(db.Float)
+    dx: Mapped[Optional[float]] = mapped_column(db.Float)
+    dx_u: Mapped[Optional[float]] = mapped_column(db.Float)
+    dx_rel: Mapped[Optional[float]] = mapped_column(db.Float)
+    p1: Mapped[Optional[float]] = mapped_column(db.Float)
+    p1_u: Mapped[Optional[float]] = mapped_column(db.Float)
+    p2: Mapped[Optional[float]] = mapped_column(db.Float)
+    p2_u: Mapped[Optional[float]] = mapped_column(db.Float)
+    # why the analysis failed
+    error: Mapped[Optional[str]] = mapped_column(db.Text)
+    test_id: Mapped[int] = mapped_column(db.ForeignKey("test.id"), index=True)
+    constants_id: Mapped[int] = mapped_column(db.ForeignKey("constants.id"))
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "test_id",
+            "window_start",
+            "window_finish",
+            "constants_id",
+            name="uq_result",
+        ),
+        # test list sort orders, test_id breaks ties
+        db.Index("ix_result_start", "start", "test_id"),
+        db.Index("ix_result_cd", "cd", "test_id"),
+        db.Index("ix_result_cd_rel", "cd_rel", "test_id"),
+    )
+
+
+class CdWindow(db.Model):
+    id: Mapped[int] = mapped_column(db.Integer, primary_key=True)
+    # scans start to finish (exclusive) of the test, one of its windows of width scans
+    # stepped by stride scans
+    start: Mapped[int] = mapped_column(db.Integer)
+    finish: Mapped[int] = mapped_column(db.Integer)
+    width: Mapped[int] = mapped_column(db.Integer)
+    stride: Mapped[int] = mapped_column(db.Integer)
+    # null when Cd is undefined over the window
+    cd: Mapped[Optional[float]] = mapped_column(db.Float)
+    cd_u: Mapped[Optional[float]] = mapped_column(db.Float)
+    test_id: Mapped[int] = mapped_column(db.ForeignKey("test.id"))
+    constants_id: Mapped[int] = mapped_column(db.ForeignKey("constants.id"))
+
+    __table_args__ = (
+        db.Index("ix_cd_window_series", "test_id", "constants_id", "width", "stride", "start"),
+    )
@@ -0,0 +1,72 @@
+import os
+import time
+
+import matplotlib
+from matplotlib import font_manager
+from matplotlib.figure import Figure
+
+# applied once per rendering process, before its first figure
+STYLE = {
+    "font.family": "DejaVu Sans",
+    "font.size": 10,
+    "figure.figsize": (6.4, 4.8),
+    "figure.dpi": 100,
+    "savefig.format": "png",
+}
+
+
+def setup() -> None:
+    """Applies STYLE and loads the font, so the first render does not pay for the font lookup"""
+    matplotlib.rcParams.update(STYLE)
+    font_manager.findfont(STYLE["font.family"])
+
+
+def save(fig: Figure, path: str, **kwargs) -> None:
+    """
+    Writes fig as a PNG to path and releases it, the image only appears once complete, so
+    a reader never serves a partial PNG
+    """
+    try:
+        fig.savefig(path + ".part", format="png", **kwargs)
+        os.replace(path + ".part", path)
+    finally:
+        fig.clear()
+
+
+def cd_series(path: str, series: dict, bounds: tuple, ylim: float = None) -> float:
+    """
+    Plots a time-resolved Cd series with its uncertainty band and the analysis window in
+    seconds, up to ylim when given, returns the render seconds
+    """
+    t0 = time.perf_counter()
+    fig = Figure()
+    ax = fig.subplots()
+    ax.fill_between(
+        series["t"],
+        series["cd"] - series["cd_u"],
+        series["cd"] + series["cd_u"],
+        color="lightblue",
+        label="+/- U Cd",
+    )
+    ax.plot(series["t"], series["cd"], color="blue", label="Cd")
+    ax.axvspan(*bounds, color="gray", alpha=0.2, label="Window")
+    if ylim is not None:
+        ax.set_ylim(0, ylim)
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Cd")
+    ax.set_title(f"Cd over {series['width']} scan windows")
+    ax.legend()
+    save(fig, path, bbox_inches="tight")
+    return time.perf_counter() - t0
+
+
+def uncertainty(path: str, names: list[str], percentages: list[float]) -> float:
+    """Plots the uncertainty percentage contribution of every variable, returns the render seconds"""
+    t0 = time.perf_counter()
+    fig = Figure()
+    ax = fig.subplots()
+    ax.bar(x=names, height=percentages, color="blue")
+    ax.set_xlabel("Variable")
+    ax.set_ylabel("Percentage Uncertainty wrt CD")
+    save(fig, path)
+    return time.perf_counter() - t0
@@ -0,0 +1,140 @@
+import struct
+import warnings
+
+import numpy as np
+
+from app.mapped import MappedFile
+
+
+class Pyramid(MappedFile):
+    """
+    Memory-mapped min/max decimation levels of a test's samples, for plots whose cost does
+    not grow with the test length
+
+    Level k >= 1 holds the min and max of every column over bins of factor ** k scans,
+    skipped (-9999) and NaN samples left out, NaN for bins without samples. Level 0 is the
+    samples themselves and is not stored.
+    Layout: a 4096 byte header (magic, scan count, column count, factor, level count, json
+    column names), then every level as (bins, 2, columns) float64, finest first.
+    Built in chunks: append bins scans into level 1 as they come, close fills the coarser
+    levels from the finer ones, so memory is bounded by the chunk size, not the test length
+    """
+
+    MAGIC = b"SDPY"
+
+    def __init__(self, path: str, buffer: np.ndarray):
+        super().__init__(path, buffer)
+        self.count, self.width, self.factor, levels = struct.unpack_from("<QIII", buffer, 4)
+        self.names = self.read_json(buffer, 24)
+        self.levels = [None]
+        offset = self.HEADER_SIZE
+        for k in range(1, levels + 1):
+            bins = self.bins(self.count, self.factor**k)
+            self.levels.append(
+                np.ndarray((bins, 2, self.width), dtype="<f8", buffer=buffer, offset=offset)
+            )
+            offset += bins * 2 * self.width * 8
+
+    @staticmethod
+    def bins(count: int, size: int) -> int:
+        return -(-count // size)
+
+    @staticmethod
+    def depth(count: int, factor: int) -> int:
+        """Number of stored levels: until a level fits in a single bin"""
+        levels = 1
+        while factor**levels < count:
+            levels += 1
+        return levels
+
+    @classmethod
+    def size(cls, count: int, width: int, factor: int) -> int:
+        return cls.HEADER_SIZE + sum(
+            cls.bins(count, factor**k) * 2 * width * 8
+            for k in range(1, cls.depth(count, factor) + 1)
+        )
+
+    @staticmethod
+    def bin(lo: np.ndarray, hi: np.ndarray, size: int) -> np.ndarray:
+        """
+        Given (n, columns) minimums and maximums, samples being both, returns the
+        (bins, 2, columns) min and max over every size of them, the last bin taking the rest
+        Skipped (-9999) and NaN values are left out, NaN for bins without values
+        """
+        bins = Pyramid.bins(len(lo), size)
+        padded = np.full((bins * size, 2, lo.shape[1]), np.nan)
+        padded[: len(lo), 0] = lo
+        padded[: len(hi), 1] = hi
+        padded[padded == -9999.0] = np.nan
+        padded = padded.reshape(bins, size, 2, lo.shape[1])
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return np.stack(
+                [np.nanmin(padded[:, :, 0], axis=1), np.nanmax(padded[:, :, 1], axis=1)], axis=1
+            )
+
+    @classmethod
+    def create(cls, path: str, count: int, names: list[str], factor: int) -> "Pyramid":
+        """
+        Allocates the levels of count scans of the named columns, to be filled by append and
+        close, in memory when path is None
+        """
+        data = cls.encode(names, 24)
+        width = len(names)
+        buffer = cls.allocate(path, cls.size(count, width, factor))
+        struct.pack_into("<QIII", buffer, 4, count, width, factor, cls.depth(count, factor))
+        cls.write_json(buffer, 24, data)
+        pyramid = cls(path, buffer)
+        pyramid.filled = 0
+        pyramid.rest = np.empty((0, width))
+        return pyramid
+
+    def append(self, values: np.ndarray) -> None:
+        """Bins the next (scans, columns) values into level 1, scans short of a bin wait for more"""
+        if len(self.rest):
+            values = np.concatenate([self.rest, values])
+        full = len(values) // self.factor * self.factor
+        first = self.filled // self.factor
+        self.levels[1][first : first + full // self.factor] = self.bin(
+            values[:full], values[:full], self.factor
+        )
+        self.filled += full
+        self.rest = np.array(values[full:], dtype="f8")
+
+    def close(self, block: int = 1 << 16) -> None:
+        """Bins the last scans, fills every coarser level block bins at a time and publishes"""
+        if len(self.rest):
+            self.levels[1][self.filled // self.factor :] = self.bin(self.rest, self.rest, self.factor)
+            self.filled += len(self.rest)
+            self.rest = self.rest[:0]
+        for finer, level in zip(self.levels[1:], self.levels[2:]):
+            for at in range(0, len(level), block):
+                bins = finer[at * self.factor : (at + block) * self.factor]
+                level[at : at + block] = self.bin(bins[:, 0], bins[:, 1], self.factor)
+        self.publish()
+
+    @classmethod
+    def open(cls, path: str) -> "Pyramid":
+        """Opens an existing pyramid file read only, raises ValueError unless it holds the scans its header counts"""
+        pyramid = cls(path, cls.map(path))
+        if len(pyramid.buffer) != cls.size(pyramid.count, pyramid.width, pyramid.factor):
+            raise ValueError(f"{path} does not hold {pyramid.count} scans")
+        return pyramid
+
+    def level(self, start: int, finish: int, points: int) -> int:
+        """Returns the coarsest level with at least points bins over scans start to finish, 0 for the samples"""
+        span = max(finish - start, 1)
+        k = 0
+        while k + 1 < len(self.levels) and span / self.factor ** (k + 1) >= points:
+            k += 1
+        return k
+
+    def read(self, k: int, start: int, finish: int) -> tuple[int, np.ndarray]:
+        """
+        Returns the first scan of the bins of level k >= 1 overlapping scans start to finish
+        and their (bins, 2, columns) min and max
+        """
+        size = self.factor**k
+        first = max(start, 0) // size
+        last = self.bins(min(finish, self.count), size)
+        return first * size, self.levels[k][first:last]
@@ -0,0 +1,120 @@
+from app.extensions import db
+from app.models import Result
+
+from sqlalchemy import select, delete
+from flask import current_app
+
+import json, threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Memoizes cd_dicts, or the exception that stopped the analysis, by
+    (test_id, window_start, window_finish, constants_id)
+    Least recently used entries are evicted past RESULT_CACHE_SIZE, every entry is also
+    stored in the Result table, with typed columns for the test list, and reloaded from it
+    Entries only depend on the scans inside their window, analyzing a test drops the entries
+    of its new window when the ufloats changed, and its failed ones
+    """
+
+    lock = threading.Lock()
+    entries = OrderedDict()
+
+    @staticmethod
+    def get(key: tuple):
+        with ResultCache.lock:
+            if key in ResultCache.entries:
+                ResultCache.entries.move_to_end(key)
+                return ResultCache.entries[key]
+        test_id, window_start, window_finish, constants_id = key
+        stored = db.session.execute(
+            select(Result.cd_dict, Result.error).where(
+                Result.test_id == test_id,
+                Result.window_start == window_start,
+                Result.window_finish == window_finish,
+                Result.constants_id == constants_id,
+            )
+        ).one_or_none()
+        if stored is None:
+            return None
+        cd_dict = json.loads(stored.cd_dict) if stored.error is None else ValueError(stored.error)
+        ResultCache.remember(key, cd_dict)
+        return cd_dict
+
+    @staticmethod
+    def put(key: tuple, cd_dict, start: str, commit: bool = True):
+        """
+        Caches and stores cd_dict, or the exception that stopped the analysis, and returns
+        the cached form, in which ufloat values are strings so results read the same
+        whether they were calculated or reloaded
+        Without commit the Result row is only added to the session
+        """
+        test_id, window_start, window_finish, constants_id = key
+        result = Result(
+            test_id=test_id,
+            window_start=window_start,
+            window_finish=window_finish,
+            constants_id=constants_id,
+            start=start,
+        )
+        if isinstance(cd_dict, Exception):
+            result.cd_dict = "null"
+            result.error = str(cd_dict)
+        else:
+            # the unrounded values, the strings in cd_dict are rounded for display
+            for column, value in cd_dict.pop("summary").items():
+                setattr(result, column, value)
+            cd_dict = json.loads(json.dumps(cd_dict, default=str))
+            result.cd_dict = json.dumps(cd_dict)
+        ResultCache.remember(key, cd_dict)
+        db.session.add(result)
+        if commit:
+            ResultCache.commit()
+        return cd_dict
+
+    @staticmethod
+    def commit() -> None:
+        """
+        Commits the session, on a conflict retries its new Result rows one at a time and skips
+        the ones stored meanwhile by another request or the warming thread
+        """
+        results = [r for r in db.session.new if isinstance(r, Result)]
+        try:
+            db.session.commit()
+        except db.exc.IntegrityError:
+            db.session.rollback()
+            for result in results:
+                try:
+                    db.session.add(result)
+                    db.session.commit()
+                except db.exc.IntegrityError:
+                    db.session.rollback()
+
+    @staticmethod
+    def remember(key: tuple, cd_dict) -> None:
+        with ResultCache.lock:
+            ResultCache.entries[key] = cd_dict
+            ResultCache.entries.move_to_end(key)
+            while len(ResultCache.entries) > current_app.config["RESULT_CACHE_SIZE"]:
+                ResultCache.entries.popitem(last=False)
+
+    @staticmethod
+    def invalidate(test_id: int, window_start: int, window_finish: int) -> None:
+        """
+        Drops a test's results over one window, under every constants, and its failed results
+        Stored ones are deleted with the caller's next commit
+        """
+        with ResultCache.lock:
+            for key, cd_dict in list(ResultCache.entries.items()):
+                if key[0] == test_id and (
+                    key[1:3] == (window_start, window_finish) or isinstance(cd_dict, Exception)
+                ):
+                    del ResultCache.entries[key]
+        db.session.execute(
+            delete(Result).where(
+                Result.test_id == test_id,
+                (Result.window_start == window_start) & (Result.window_finish == window_finish)
+                | Result.error.is_not(None),
+            )
+        )
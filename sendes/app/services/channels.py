@@ -0,0 +1,59 @@
+from app.extensions import db
+from app.models import Ljconfig, Channel
+
+from sqlalchemy import select
+
+
+class ChannelService:
+    """
+    Scan lists are rows of the Channel table, one per analog input, in stream order
+    Configs saved before channels were configurable stream DEFAULT
+    """
+
+    # name, +/- volts, role
+    DEFAULT = [("AIN0", 10.0, "p1"), ("AIN1", 1.0, "p2"), ("AIN2", 1.0, "x")]
+    # T7 stream limit in samples per second over all channels
+    MAX_SAMPLE_RATE = 100000
+
+    @staticmethod
+    def default() -> list[Channel]:
+        return [
+            Channel(position=i, name=name, range=rng, role=role)
+            for i, (name, rng, role) in enumerate(ChannelService.DEFAULT)
+        ]
+
+    @staticmethod
+    def copy(channels: list[Channel]) -> list[Channel]:
+        return [
+            Channel(position=c.position, name=c.name, range=c.range, role=c.role)
+            for c in channels
+        ]
+
+    @staticmethod
+    def signature(channels: list[Channel]) -> str:
+        """Given channels, returns a string identifying the scan list, e.g. AIN0:10.0:p1,AIN1:1.0:p2"""
+        return ",".join(f"{c.name}:{float(c.range)}:{c.role}" for c in channels)
+
+    @staticmethod
+    def registers(channels: list[Channel]) -> dict:
+        """Returns the range register of every channel"""
+        return {f"{c.name}_RANGE": c.range for c in channels}
+
+    @staticmethod
+    def columns(ljconfig: Ljconfig, names: list[str]) -> dict[str, int]:
+        """
+        Given a test's ljconfig and the channel names stored with its scans,
+        returns the scan column of every role
+        """
+        index = {name: i for i, name in enumerate(names)}
+        return {c.role: index[c.name] for c in ljconfig.channels if c.name in index}
+
+    @staticmethod
+    def backfill() -> None:
+        """Gives configs saved before channels were configurable the DEFAULT channels"""
+        for ljconfig in db.session.execute(
+            select(Ljconfig).where(Ljconfig.scan_list == None)
+        ).scalars():
+            ljconfig.channels = ChannelService.default()
+            ljconfig.scan_list = ChannelService.signature(ljconfig.channels)
+        db.session.commit()
@@ -0,0 +1,49 @@
+from app.extensions import db, ur
+from app.models import Constants
+from app.services.database import dbService
+
+from sqlalchemy import select
+
+from uncertainties import ufloat
+from pint import Quantity
+
+
+class ConstantsService:
+    @staticmethod
+    def create(form):
+        constants_entry = Constants()
+        form.populate_obj(constants_entry)
+        constants_entry.is_active = False
+        try:
+            db.session.add(constants_entry)
+            db.session.commit()
+        except db.exc.IntegrityError as e:
+            db.session.rollback()
+            constants_entry = dbService.fetch_existing(Constants, constants_entry)
+            if constants_entry is None:
+                form.form_errors.append(f"Constants could not be saved: {e.orig}")
+        return constants_entry
+
+    @staticmethod
+    def activate(constants_id):
+        new_active_constant = db.session.get(Constants, constants_id)
+        if new_active_constant.is_active:
+            return
+        active_constant = db.session.execute(
+            select(Constants).where(Constants.is_active == True)
+        ).scalar_one_or_none()
+        if active_constant is not None:
+            active_constant.is_active = False
+            db.session.add(active_constant)
+        new_active_constant.is_active = True
+        db.session.add(new_active_constant)
+        db.session.commit()
+        return
+
+    @staticmethod
+    def get_vars(c: Constants) -> tuple[Quantity, Quantity, Quantity, Quantity]:
+        d = (ufloat(c.piston_avg, c.piston_uncertainty) * ur.inch).to("meter")
+        d1 = (ufloat(c.pipe_avg, c.pipe_uncertainty) * ur.inch).to("meter")
+        d2 = (ufloat(c.orifice_avg, c.orifice_uncertainty) * ur.inch).to("meter")
+        rho = ufloat(c.rho_avg, c.rho_uncertainty) * ur.kg / (ur.meter**3)
+        return d, d1, d2, rho
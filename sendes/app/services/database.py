@@ -0,0 +1,339 @@
+from app.extensions import db, console
+from app.models import Constants, Ljconfig, Test, StreamRead, Scan, Result
+from app.devices import sample_waveform
+from app.services.channels import ChannelService
+from app.services.scans import ScanService
+from app.services.stats import StatsService, PyramidService
+
+from sqlalchemy import select, insert, update, and_, inspect, text, func
+from sqlalchemy.schema import CreateTable, AddConstraint, DropConstraint
+from flask import current_app
+
+import json, time
+from datetime import datetime, timedelta
+import numpy as np
+from labjack import ljm
+
+
+class dbService:
+    # gets existing row based on unique constraint
+    @staticmethod
+    def fetch_existing(model, instance):
+        """
+        Gets existing model instance with matching properties, None when the insert
+        conflicted with something else than the model's unique constraint
+        """
+        conditions = []
+        for attr in inspect(instance).attrs:
+            # Reflectively build conditions based on the object's attributes (ChatGPT)
+            # only constrained fields
+            if attr.key in {c.name for c in model.__table_args__[0].columns}:
+                conditions.append(
+                    getattr(model, attr.key) == getattr(instance, attr.key)
+                )
+        instance = db.session.execute(
+            select(model).where(and_(*conditions))
+        ).scalar_one_or_none()
+        return instance
+
+    @staticmethod
+    def populate_sample_data():
+        from app.services.ljconfig import LjconfigService
+
+        scan_rate = 267
+        stream_reads = 5
+        sec_div = 2
+        ain0_uncertainty = (0.007120869,)
+        ain1_uncertainty = (0.007436709,)
+        ain2_uncertainty = (6.08881e-5,)
+
+        scans_per_read = int(scan_rate / sec_div)
+        constants = Constants(
+            piston_avg=3.505,
+            piston_uncertainty=0.002284631,
+            orifice_avg=0.238,
+            orifice_uncertainty=7.84915e-4,
+            rho_avg=1000,
+            rho_uncertainty=0,
+            pipe_avg=0.618,
+            pipe_uncertainty=0.001129,
+            p1_slope=0.9977953,
+            p1_offset=-0.008752722,
+            p2_slope=1.002007,
+            p2_offset=0.1061045,
+            is_active=True,
+        )
+        ljconfig = Ljconfig(
+            scan_rate=scan_rate,
+            scan_rate_actual=scan_rate,
+            buffer_size=scans_per_read,
+            read_count=stream_reads,
+            ain_all_negative_ch=ljm.constants.GND,
+            stream_settling_us=0,
+            stream_resolution_index=8,
+            is_active=True,
+            is_valid=True,
+            error_message="None",
+            channels=ChannelService.default(),
+        )
+        ljconfig.scan_list = ChannelService.signature(ljconfig.channels)
+
+        t = datetime.now()
+        w_start, w_finish = LjconfigService.get_default_window(ljconfig)
+        test = Test(
+            start=t.isoformat(),
+            finish=(t + timedelta(seconds=stream_reads / sec_div)).isoformat(),
+            duration=str(
+                (timedelta(seconds=stream_reads / sec_div)).seconds
+                + float((timedelta(seconds=stream_reads / sec_div)).microseconds)
+                / 1000000
+            ),
+            scan_rate_actual=scan_rate,
+            window_start=w_start,
+            window_finish=w_finish,
+            ufloat_vp1="not analyzed",
+            ufloat_vp2="not analyzed",
+            ufloat_vdx="not analyzed",
+        )
+        #
+        x = np.arange(0, stream_reads / sec_div, 1 / scan_rate)
+        # sample test data
+        ain0, ain1, ain2 = sample_waveform(x)
+
+        # apply noise
+        ain0 = np.random.normal(ain0, ain0_uncertainty)
+        ain1 = np.random.normal(ain1, ain1_uncertainty)
+        ain2 = np.random.normal(ain2, ain2_uncertainty)
+
+        # create stream reads and scans
+        test.pending_reads = []
+        test.pending_channels = [c.name for c in ljconfig.channels]
+        j = 1
+        for k in range(5):
+            i = k * 0.5
+            in_read = (i < x) & (i + 0.5 > x)
+            test.pending_reads.append(
+                {
+                    "stream_i": j,
+                    "skipped": 0,
+                    "lj_backlog": 0,
+                    "ljm_backlog": 0,
+                    "samples": np.column_stack(
+                        (ain0[in_read], ain1[in_read], ain2[in_read])
+                    ).ravel(),
+                }
+            )
+            j += 1
+
+        constants.tests = [test]
+        ljconfig.tests = [test]
+        db.session.add(constants)
+        db.session.add(ljconfig)
+        dbService.save_test(test)
+
+    @staticmethod
+    def save_test(test_entry: Test) -> Test:
+        """
+        Persists a test and its pending stream reads
+        Samples are packed into scan blocks, or Scan rows when SCAN_STORAGE is "rows" and
+        the scan list is ScanService.ROW_CHANNELS
+        Reads are saved SAVE_CHUNK_READS at a time, each chunk packed from its spool rows,
+        written with executemany Core inserts and committed before the next one is packed, so
+        memory does not grow with the test length. The test id is written to the spool first,
+        recovering the spool of an interrupted save only adds the reads not stored yet
+        The test's min/max pyramid is then built from the spool rows the same way
+        """
+        t0 = time.perf_counter()
+        db.session.add(test_entry)
+        db.session.commit()
+        spool = getattr(test_entry, "spool", None)
+        if spool is not None and spool.path is not None:
+            spool.write_meta(spool.meta | {"test_id": test_entry.id})
+            spool.sync(0, spool.HEADER_SIZE)
+
+        blob = (
+            current_app.config["SCAN_STORAGE"] == "blob"
+            or test_entry.pending_channels != ScanService.ROW_CHANNELS
+        )
+        width = len(test_entry.pending_channels)
+        chunk = current_app.config["SAVE_CHUNK_READS"]
+        stored, first_sample = db.session.execute(
+            select(func.count(StreamRead.id), func.coalesce(func.sum(StreamRead.scan_count), 0))
+            .where(StreamRead.test_id == test_entry.id)
+        ).one()
+        if stored:
+            # indexes of the reads stored before the interruption
+            StatsService.discard(test_entry.id)
+        rows = 1
+        for at in range(stored, len(test_entry.pending_reads), chunk):
+            pending = test_entry.pending_reads[at : at + chunk]
+            reads = []
+            for r in pending:
+                scan_count = len(r["samples"]) // width
+                reads.append(
+                    {k: v for k, v in r.items() if k != "samples"}
+                    | {
+                        "test_id": test_entry.id,
+                        "first_sample": first_sample,
+                        "scan_count": scan_count,
+                        "data": ScanService.pack(r["samples"], test_entry.pending_channels)
+                        if blob
+                        else None,
+                        "stats": StatsService.aggregate(
+                            np.asarray(r["samples"], dtype="f8").reshape(-1, width)
+                        ).tobytes(),
+                    }
+                )
+                first_sample += scan_count
+            conn = db.session.connection()
+            if blob:
+                conn.execute(insert(StreamRead.__table__), reads)
+            else:
+                stream_read_ids = conn.scalars(
+                    insert(StreamRead.__table__).returning(
+                        StreamRead.id, sort_by_parameter_order=True
+                    ),
+                    reads,
+                ).all()
+                scans = []
+                for stream_read_id, r, read in zip(stream_read_ids, pending, reads):
+                    samples = np.asarray(r["samples"], dtype="f8").reshape(-1, 3).tolist()
+                    scans.extend(
+                        {
+                            "ain0": a0,
+                            "ain1": a1,
+                            "ain2": a2,
+                            "sample_i": read["first_sample"] + k,
+                            "stream_read_id": stream_read_id,
+                        }
+                        for k, (a0, a1, a2) in enumerate(samples)
+                    )
+                conn.execute(insert(Scan.__table__), scans)
+                rows += len(scans)
+            rows += len(reads)
+            db.session.commit()
+
+        elapsed = time.perf_counter() - t0
+        # min/max plot pyramid from the same spool rows, a chunk of reads at a time
+        pending = test_entry.pending_reads
+        PyramidService.build(
+            test_entry,
+            first_sample,
+            test_entry.pending_channels,
+            (
+                np.concatenate(
+                    [np.reshape(r["samples"], (-1, width)) for r in pending[at : at + chunk]]
+                )
+                for at in range(0, len(pending), chunk)
+            ),
+        )
+        stats = json.loads(test_entry.acquisition_stats or "{}")
+        stats.update(persist_rows=rows, persist_s=elapsed, persist_rows_per_s=rows / elapsed)
+        test_entry.acquisition_stats = json.dumps(stats)
+        db.session.commit()
+        test_entry.pending_reads = []
+        if spool is not None:
+            spool.delete()
+            test_entry.spool = None
+
+        console.print(
+            f"\nSaved test {test_entry.id}: {rows} rows in {elapsed:.3f} s ({rows / elapsed:.0f} rows/second)",
+            style="magenta",
+        )
+        return test_entry
+
+    @staticmethod
+    def normalize_starts():
+        """
+        Rewrites test and result start dates stored as str(datetime) in isoformat, the format
+        tests are started with, so they sort as one representation
+        """
+        for model in (Test, Result):
+            db.session.execute(
+                update(model)
+                .where(model.start.like("% %"))
+                .values(start=func.replace(model.start, " ", "T"))
+            )
+        db.session.commit()
+
+    @staticmethod
+    def upgrade_schema():
+        """
+        Adds nullable columns and indexes introduced after a database was created,
+        create_all only adds tables
+        """
+        inspector = inspect(db.engine)
+        with db.engine.begin() as conn:
+            for table in db.metadata.sorted_tables:
+                existing = {c["name"] for c in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing and column.nullable:
+                        col_type = column.type.compile(dialect=db.engine.dialect)
+                        conn.execute(
+                            text(
+                                f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"
+                            )
+                        )
+                indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in indexes:
+                        index.create(conn)
+                # unique constraints whose columns changed, such as uq_ljconfig gaining scan_list
+                unique = {
+                    frozenset(u["column_names"])
+                    for u in inspector.get_unique_constraints(table.name)
+                }
+                changed = [
+                    c
+                    for c in table.constraints
+                    if isinstance(c, db.UniqueConstraint)
+                    and frozenset(col.name for col in c.columns) not in unique
+                ]
+                if not changed:
+                    continue
+                if db.engine.dialect.name == "sqlite":
+                    dbService.rebuild_table(conn, table)
+                    continue
+                named = {u["name"] for u in inspector.get_unique_constraints(table.name)}
+                for constraint in changed:
+                    if constraint.name in named:
+                        conn.execute(DropConstraint(constraint))
+                    conn.execute(AddConstraint(constraint))
+
+    @staticmethod
+    def rebuild_table(conn, table) -> None:
+        """
+        Recreates a SQLite table from the model, keeping its rows, SQLite cannot alter
+        constraints. Rows that break the new constraints stop the upgrade
+        """
+        existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+        columns = ", ".join(c.name for c in table.columns if c.name in existing)
+        create = str(CreateTable(table).compile(conn)).strip()
+        create = create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {table.name}_new ", 1)
+        conn.execute(text(create))
+        conn.execute(
+            text(f"INSERT INTO {table.name}_new ({columns}) SELECT {columns} FROM {table.name}")
+        )
+        # the table's indexes go with it, rows referencing it keep their ids
+        conn.execute(text(f"DROP TABLE {table.name}"))
+        conn.execute(text(f"ALTER TABLE {table.name}_new RENAME TO {table.name}"))
+        for index in table.indexes:
+            index.create(conn)
+
+    @staticmethod
+    def start():
+        # imported here, the stream and results modules import this one
+        from app.services.stream import SpoolService
+        from app.services.results import ResultService
+
+        dbService.upgrade_schema()
+        dbService.normalize_starts()
+        ChannelService.backfill()
+        ScanService.backfill()
+        SpoolService.recover()
+        # create sample data - ljconfig, constants, test, streamreads, scan
+        # get actual values from matlab UncertaintyPropagation for voltages and constants
+        if not db.session.get(Constants, 1):
+            dbService.populate_sample_data()
+        # results of recovered and older tests, the test list only reads stored results
+        ResultService.warm()
@@ -0,0 +1,41 @@
+from app.devices import DeviceSession, SimulatedT7
+from app.services.scans import ScanService
+
+from flask import current_app
+
+import atexit, threading
+from labjack import ljm
+
+
+class DeviceService:
+    @staticmethod
+    def get():
+        """
+        Returns the LabJack backend selected by LJ_BACKEND: the labjack.ljm module,
+        or a SimulatedT7 exposing the same calls, optionally replaying a stored test
+        """
+        config = current_app.config
+        if config["LJ_BACKEND"] != "sim":
+            return ljm
+        replay = None
+        if config["SIM_REPLAY_TEST"]:
+            scans, names = ScanService.load(int(config["SIM_REPLAY_TEST"]))
+            replay = dict(zip(names, scans.T))
+        return SimulatedT7(
+            replay=replay,
+            max_speed=config["SIM_MAX_SPEED"],
+            skip_rate=config["SIM_SKIP_RATE"],
+            ljm_buffer_scans=config["SIM_LJM_BUFFER_SCANS"],
+        )
+
+    session_lock = threading.Lock()
+    device_session = None
+
+    @staticmethod
+    def session() -> DeviceSession:
+        """Returns the process wide device session, created on first use"""
+        with DeviceService.session_lock:
+            if DeviceService.device_session is None:
+                DeviceService.device_session = DeviceSession(DeviceService.get())
+                atexit.register(DeviceService.device_session.close)
+            return DeviceService.device_session
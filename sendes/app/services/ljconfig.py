@@ -0,0 +1,258 @@
+from app.extensions import db, console
+from app.models import Ljconfig, Channel, Test
+from app.services.channels import ChannelService
+from app.services.database import dbService
+
+from sqlalchemy import select, and_
+from flask import current_app
+
+import math, time
+import numpy as np
+from labjack import ljm
+
+
+class LjconfigService:
+    @staticmethod
+    def create(form):
+        ljconfig_entry = Ljconfig()
+        # channel rows become Channel entries below
+        for field in form:
+            if field.name != "channel_list":
+                field.populate_obj(ljconfig_entry, field.name)
+        ljconfig_entry.is_active = False
+        ljconfig_entry.is_valid = False
+        ljconfig_entry.ain_all_negative_ch = ljm.constants.GND
+        ljconfig_entry.buffer_size = int(ljconfig_entry.scan_rate / 2)
+        ljconfig_entry.error_message = "None"
+        ljconfig_entry.scan_rate_actual = 0
+        ljconfig_entry.channels = [
+            Channel(position=i, name=row["name"], range=row["range"], role=row["role"])
+            for i, row in enumerate(r for r in form.channel_list.data if r["name"])
+        ]
+        ljconfig_entry.scan_list = ChannelService.signature(ljconfig_entry.channels)
+        try:
+            db.session.add(ljconfig_entry)
+            db.session.commit()
+            ljconfig_entry = LjconfigService.validate(ljconfig_entry)
+        except db.exc.IntegrityError as e:
+            db.session.rollback()
+            ljconfig_entry = dbService.fetch_existing(Ljconfig, ljconfig_entry)
+            if ljconfig_entry is None:
+                form.form_errors.append(f"LJConfig could not be saved: {e.orig}")
+                return None
+        if form.autotune.data:
+            ljconfig_entry = LjconfigService.autotune(ljconfig_entry)
+        return ljconfig_entry
+
+    @staticmethod
+    def activate(ljconfig_id):
+        new_active_ljconfig = db.session.execute(
+            select(Ljconfig).where(
+                and_(Ljconfig.id == ljconfig_id, Ljconfig.is_valid == True)
+            )
+        ).scalar_one_or_none()
+        if (
+            new_active_ljconfig is not None
+            and new_active_ljconfig.is_active
+            or new_active_ljconfig is None
+        ):
+            return
+        active_ljconfig = db.session.execute(
+            select(Ljconfig).where(Ljconfig.is_active == True)
+        ).scalar_one_or_none()
+        if active_ljconfig is not None:
+            active_ljconfig.is_active = False
+            db.session.add(active_ljconfig)
+        new_active_ljconfig.is_active = True
+        db.session.add(new_active_ljconfig)
+        db.session.commit()
+        return
+
+    @staticmethod
+    def validate(ljconfig_entry):
+        # imported here, the stream module imports this one
+        from app.services.stream import TestService
+
+        result = TestService.execute(ljconfig_entry, live=False)
+        if isinstance(result, Test):
+            if LjconfigService.backlogged(result.pending_reads):
+                ljconfig_entry.error_message = "Too many backlogs"
+            else:
+                ljconfig_entry.is_valid = True
+            ljconfig_entry.scan_rate_actual = result.scan_rate_actual
+        else:
+            ljconfig_entry.error_message = str(result)
+
+        db.session.add(ljconfig_entry)
+        db.session.commit()
+        return ljconfig_entry
+
+    @staticmethod
+    def backlogged(reads: list[dict]) -> bool:
+        """True if any stream read left more than 100 scans in the device or LJM buffer"""
+        return any((r["lj_backlog"] > 100) or (r["ljm_backlog"] > 100) for r in reads)
+
+    @staticmethod
+    def probe(ljconfig: Ljconfig, scan_rate: int, buffer_size: int) -> dict:
+        """
+        Runs a short non-live stream at scan_rate and buffer_size with ljconfig's other settings
+        Sustainable when nothing is skipped, backlogs stay within validate's limit, the
+        backlog grows by less than AUTOTUNE_MAX_GROWTH of a buffer per read (least squares slope)
+        and the scans read between the first and last read fall short of the scan rate by less
+        than half a read, the host timing jitter. Latency is the age of the oldest sample of a
+        read when it arrives, worst over the reads
+        """
+        from app.services.stream import TestService
+
+        config = current_app.config
+        probe_config = Ljconfig(
+            scan_rate=scan_rate,
+            buffer_size=buffer_size,
+            read_count=max(5, math.ceil(config["AUTOTUNE_PROBE_S"] * scan_rate / buffer_size)),
+            ain_all_negative_ch=ljconfig.ain_all_negative_ch,
+            stream_settling_us=ljconfig.stream_settling_us,
+            stream_resolution_index=ljconfig.stream_resolution_index,
+            channels=ChannelService.copy(ljconfig.channels),
+        )
+        probe = {"scan_rate": scan_rate, "buffer_size": buffer_size, "sustainable": False}
+        result = TestService.execute(probe_config, live=False)
+        if not isinstance(result, Test):
+            return probe | {"error": str(result)}
+
+        reads = result.pending_reads
+        backlog = np.array([r["lj_backlog"] + r["ljm_backlog"] for r in reads], dtype="f8")
+        growth = np.polyfit(np.arange(len(backlog)), backlog, 1)[0] / buffer_size
+        skipped = int(sum(r["skipped"] for r in reads))
+        elapsed = reads[-1]["host_time"] - reads[0]["host_time"]
+        scans = sum(len(r["samples"]) for r in reads[1:]) / len(probe_config.channels)
+        throughput = scans / elapsed if elapsed > 0 else float("inf")
+        latency = (buffer_size + backlog.max()) / result.scan_rate_actual
+        probe |= {
+            "scan_rate_actual": result.scan_rate_actual,
+            "growth": float(growth),
+            "skipped": skipped,
+            "throughput": throughput,
+            "latency_s": float(latency),
+            "sustainable": bool(
+                skipped == 0
+                and growth < config["AUTOTUNE_MAX_GROWTH"]
+                and scans >= result.scan_rate_actual * elapsed - buffer_size / 2
+                and not LjconfigService.backlogged(reads)
+            ),
+        }
+        console.print(
+            f"Probe {scan_rate} Hz / {buffer_size} scans per read: backlog growth {growth:.4f} "
+            f"buffers per read, {skipped} skipped, {throughput:.0f} scans/s, "
+            f"{latency * 1000:.0f} ms latency -> {'ok' if probe['sustainable'] else 'too fast'}",
+            style="magenta",
+        )
+        return probe
+
+    @staticmethod
+    def autotune(ljconfig_entry: Ljconfig) -> Ljconfig:
+        """
+        Searches for the fastest scan rate, and a buffer size for it, that ljconfig_entry's settling
+        and resolution sustain: doubles the scan rate until a probe fails, then bisects
+        For each rate, buffer sizes giving AUTOTUNE_READS_PER_S reads per second are probed from
+        the smallest buffer up, the smallest buffer sustaining the rate is kept as it has the
+        lowest latency. The search stops early with what it found after AUTOTUNE_MAX_PROBES
+        probes or AUTOTUNE_MAX_S seconds, so the request adding the config stays bounded
+
+        Saves the best configuration as an Ljconfig row, keeping the test duration, with
+        headroom = first failing rate / best rate - 1 (None when the rate limit was reached)
+        """
+        config = current_app.config
+        max_rate = min(
+            config["AUTOTUNE_MAX_RATE"],
+            ChannelService.MAX_SAMPLE_RATE // len(ljconfig_entry.channels),
+        )
+        probes = []
+        deadline = time.monotonic() + config["AUTOTUNE_MAX_S"]
+
+        def exhausted() -> bool:
+            return len(probes) >= config["AUTOTUNE_MAX_PROBES"] or time.monotonic() >= deadline
+
+        def sustained(rate: int) -> dict:
+            for reads_per_s in sorted(config["AUTOTUNE_READS_PER_S"], reverse=True):
+                if exhausted():
+                    break
+                probes.append(
+                    LjconfigService.probe(ljconfig_entry, rate, max(1, int(rate / reads_per_s)))
+                )
+                if probes[-1]["sustainable"]:
+                    return probes[-1]
+            return None
+
+        best, failed = None, None
+        rate = min(ljconfig_entry.scan_rate, max_rate)
+        while best is None or (failed is None and best["scan_rate"] < max_rate):
+            if exhausted():
+                break
+            probe = sustained(rate)
+            if probe is not None:
+                best = probe
+                rate = min(rate * 2, max_rate)
+            elif best is None:
+                failed = rate
+                rate //= 2
+                if rate < 1:
+                    break
+            else:
+                failed = rate
+        if best is None:
+            ljconfig_entry.error_message = "Autotune found no sustainable scan rate" + (
+                f" in {len(probes)} probes" if exhausted() else ""
+            )
+            db.session.add(ljconfig_entry)
+            db.session.commit()
+            return ljconfig_entry
+        for _ in range(config["AUTOTUNE_STEPS"]):
+            if failed is None or failed - best["scan_rate"] <= 1 or exhausted():
+                break
+            rate = (best["scan_rate"] + failed) // 2
+            probe = sustained(rate)
+            if probe is not None:
+                best = probe
+            else:
+                failed = rate
+
+        duration = ljconfig_entry.read_count * ljconfig_entry.buffer_size / ljconfig_entry.scan_rate
+        tuned_entry = db.session.execute(
+            select(Ljconfig).where(
+                Ljconfig.scan_rate == best["scan_rate"],
+                Ljconfig.stream_settling_us == ljconfig_entry.stream_settling_us,
+                Ljconfig.stream_resolution_index == ljconfig_entry.stream_resolution_index,
+                Ljconfig.scan_list == ljconfig_entry.scan_list,
+            )
+        ).scalar_one_or_none()
+        if tuned_entry is None:
+            tuned_entry = Ljconfig(
+                scan_rate=best["scan_rate"],
+                stream_settling_us=ljconfig_entry.stream_settling_us,
+                stream_resolution_index=ljconfig_entry.stream_resolution_index,
+                scan_list=ljconfig_entry.scan_list,
+                channels=ChannelService.copy(ljconfig_entry.channels),
+            )
+            db.session.add(tuned_entry)
+        tuned_entry.buffer_size = best["buffer_size"]
+        tuned_entry.read_count = max(1, round(duration * best["scan_rate"] / best["buffer_size"]))
+        tuned_entry.ain_all_negative_ch = ljconfig_entry.ain_all_negative_ch
+        tuned_entry.scan_rate_actual = best["scan_rate_actual"]
+        tuned_entry.headroom = None if failed is None else failed / best["scan_rate"] - 1
+        tuned_entry.is_active = bool(tuned_entry.is_active)
+        tuned_entry.is_valid = True
+        tuned_entry.error_message = "None"
+        db.session.commit()
+        console.print(
+            f"Autotune: {best['scan_rate']} Hz / {best['buffer_size']} scans per read after "
+            f"{len(probes)} probes{' (probe budget reached)' if exhausted() else ''}",
+            style="magenta",
+        )
+        return tuned_entry
+
+    @staticmethod
+    def get_default_window(ljconfig: Ljconfig) -> tuple[int, int]:
+        """Gets default window start and stop values for valid test data range"""
+        start = ljconfig.scan_rate
+        finish = int(ljconfig.buffer_size * (ljconfig.read_count - 1.8))
+        return start, finish
@@ -0,0 +1,147 @@
+from app import plots
+
+from flask import current_app
+
+import os, atexit, time, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from collections import deque
+import numpy as np
+
+
+class PoolService:
+    """
+    Process pool shared by CPU bound work, created on first use with WORKERS spawned processes
+    With WORKERS = 0 work runs in the calling thread
+    """
+
+    lock = threading.Lock()
+    executor = None
+
+    @staticmethod
+    def get() -> ProcessPoolExecutor:
+        if current_app.config["WORKERS"] < 1:
+            return None
+        with PoolService.lock:
+            if PoolService.executor is None:
+                PoolService.executor = ProcessPoolExecutor(
+                    current_app.config["WORKERS"],
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                atexit.register(PoolService.executor.shutdown)
+            return PoolService.executor
+
+    @staticmethod
+    def map(fn, *iterables) -> list:
+        """Like map, run over the pool, fn must be a module level function"""
+        executor = PoolService.get()
+        if executor is None:
+            return list(map(fn, *iterables))
+        return list(executor.map(fn, *iterables))
+
+
+class RenderService:
+    """
+    Renders images with the app.plots functions, in a pool of RENDER_WORKERS spawned
+    processes set up once with the plot style, or in the calling thread with RENDER_WORKERS = 0
+    Images are keyed by their static path: a request for an image that is already rendering
+    waits for that render instead of starting another. Keeps the latency of recent renders
+    """
+
+    base = "sendes/app"
+    lock = threading.Lock()
+    executor = None
+    styled = False
+    pending = {}
+    deduped = 0
+    # (render seconds, seconds the requester waited) of recent renders
+    latency = deque(maxlen=1000)
+
+    @staticmethod
+    def get() -> ProcessPoolExecutor:
+        if current_app.config["RENDER_WORKERS"] < 1:
+            return None
+        with RenderService.lock:
+            if RenderService.executor is None:
+                RenderService.executor = ProcessPoolExecutor(
+                    current_app.config["RENDER_WORKERS"],
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=plots.setup,
+                )
+                atexit.register(RenderService.executor.shutdown)
+            return RenderService.executor
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.isfile(f"{RenderService.base}{path}")
+
+    @staticmethod
+    def submit(executor, path: str, fn, *args) -> tuple[Future, bool]:
+        """
+        Starts rendering the image at static path with fn(file, *args) on executor unless it
+        is already rendering, returns its future and whether this call started it
+        Without an executor the future is left for the caller to run
+        """
+        file = f"{RenderService.base}{path}"
+        with RenderService.lock:
+            future = RenderService.pending.get(file)
+            if future is not None:
+                RenderService.deduped += 1
+                return future, False
+            future = Future() if executor is None else executor.submit(fn, file, *args)
+            RenderService.pending[file] = future
+        return future, True
+
+    @staticmethod
+    def render_all(jobs: list[tuple]) -> list[str]:
+        """
+        Renders (static path, fn, *args) jobs whose images do not exist yet, waits for all
+        of them and returns their paths
+        """
+        t0 = time.perf_counter()
+        executor = RenderService.get()
+        started = []
+        for path, fn, *args in jobs:
+            if not RenderService.exists(path):
+                started.append((path, fn, args, *RenderService.submit(executor, path, fn, *args)))
+        try:
+            for path, fn, args, future, owner in started:
+                if owner and executor is None:
+                    if not RenderService.styled:
+                        plots.setup()
+                        RenderService.styled = True
+                    try:
+                        future.set_result(fn(f"{RenderService.base}{path}", *args))
+                    except Exception as e:
+                        future.set_exception(e)
+            for path, fn, args, future, owner in started:
+                seconds = future.result()
+                if owner:
+                    RenderService.latency.append((seconds, time.perf_counter() - t0))
+        finally:
+            with RenderService.lock:
+                for path, fn, args, future, owner in started:
+                    if owner:
+                        RenderService.pending.pop(f"{RenderService.base}{path}", None)
+        return [path for path, *_ in jobs]
+
+    @staticmethod
+    def render(path: str, fn, *args) -> str:
+        """Renders the image at static path with fn(file, *args) unless it exists, returns path"""
+        return RenderService.render_all([(path, fn, *args)])[0]
+
+    @staticmethod
+    def stats() -> dict:
+        """Returns render and wait latency percentiles over the recent renders"""
+        if not RenderService.latency:
+            return {"renders": 0, "deduped": RenderService.deduped}
+        render_ms, wait_ms = np.array(RenderService.latency).T * 1000
+        return {
+            "renders": len(render_ms),
+            "deduped": RenderService.deduped,
+            "render_ms_p50": float(np.percentile(render_ms, 50)),
+            "render_ms_p90": float(np.percentile(render_ms, 90)),
+            "render_ms_max": float(render_ms.max()),
+            "wait_ms_p50": float(np.percentile(wait_ms, 50)),
+            "wait_ms_p90": float(np.percentile(wait_ms, 90)),
+            "wait_ms_max": float(wait_ms.max()),
+        }
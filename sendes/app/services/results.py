@@ -0,0 +1,898 @@
+from app.extensions import db, ur, console
+from app.models import Constants, Ljconfig, Test, Result, CdWindow
+from app.services.cache import ResultCache
+from app.services.channels import ChannelService
+from app.services.constants import ConstantsService
+from app.services.pools import PoolService, RenderService
+from app.services.stats import StatsService
+from app.services.stream import TestService
+from app import kernels, plots
+
+from sqlalchemy import select, insert, and_, or_
+from flask import current_app
+
+import math, json, time, threading, itertools
+from functools import lru_cache
+import numpy as np
+from uncertainties import ufloat, ufloat_fromstr
+from pint import Quantity
+
+
+class ResultService:
+    @staticmethod
+    def get_vars(t: Test, c: Constants) -> tuple[Quantity, Quantity, Quantity]:
+        """
+        Given a Test and constants entry, get dx ufloat and pressure quantity_ufloats (constants contain xducer calibration)
+        """
+        dx = ResultService.v2l(ufloat_fromstr(t.ufloat_vdx) * ur.volt)
+        p1 = ResultService.v2p(ufloat_fromstr(t.ufloat_vp1) * ur.volt, "p1", c)
+        p2 = ResultService.v2p(ufloat_fromstr(t.ufloat_vp2) * ur.volt, "p2", c)
+        return dx, p1, p2
+
+    @staticmethod
+    def analyze(test_id: int, constants_id: int = None) -> dict:
+        """
+        Given a test id, returns ufloat cd string according to tested constants
+        Constants can be passed explicitly
+
+        Results are memoized by ResultCache, the returned dict is shared and must not be modified
+        Returns dict containing component uncertainties with and their UMF with respect to Cd,
+        or the exception that stopped the analysis
+        """
+        test_entry = db.session.get(Test, test_id)
+        if constants_id is None:
+            constants_id = test_entry.constants_id
+        key = (test_id, test_entry.window_start, test_entry.window_finish, constants_id)
+        cd_dict = ResultCache.get(key)
+        if cd_dict is None:
+            constants = db.session.get(Constants, constants_id)
+            cd_dict = ResultService.batch([test_entry], constants)[0]
+            if current_app.config["CD_VERIFY"]:
+                reference = ResultService.propagate(test_entry, constants)
+                for difference in ResultService.verify(cd_dict, reference):
+                    console.print(f"Test {test_id} Cd differs from pint: {difference}")
+            cd_dict = ResultCache.put(key, cd_dict, test_entry.start)
+        return cd_dict
+
+    @staticmethod
+    def summary(cd, u_cd, dx, u_dx, p1, u_p1, p2, u_p2) -> dict:
+        """
+        Given unrounded Cd, dx (in), P1 and P2 (psi) values and uncertainties, returns the
+        Result columns shown in the test list
+        """
+        return {
+            "cd": float(cd),
+            "cd_u": float(u_cd),
+            "cd_rel": float(u_cd / cd * 100) if cd else 100,
+            "dx": float(dx),
+            "dx_u": float(u_dx),
+            "dx_rel": float(u_dx / dx * 100) if dx > 0 else 100,
+            "p1": float(p1),
+            "p1_u": float(u_p1),
+            "p2": float(p2),
+            "p2_u": float(u_p2),
+        }
+
+    @staticmethod
+    def summaries(cd: np.ndarray, u_cd: np.ndarray, readings: np.ndarray) -> list[dict]:
+        """summary of many tests at once, given their Cd, uncertainties and readings"""
+        dx, u_dx, p1, u_p1, p2, u_p2 = readings.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            columns = {
+                "cd": cd,
+                "cd_u": u_cd,
+                "cd_rel": np.where(cd != 0, u_cd / cd * 100, 100),
+                "dx": dx,
+                "dx_u": u_dx,
+                "dx_rel": np.where(dx > 0, u_dx / dx * 100, 100),
+                "p1": p1,
+                "p1_u": u_p1,
+                "p2": p2,
+                "p2_u": u_p2,
+            }
+        return [
+            dict(zip(columns, row))
+            for row in zip(*(np.asarray(v, dtype="f8").tolist() for v in columns.values()))
+        ]
+
+    # test list sort orders
+    SORTS = {"date": Result.start, "cd": Result.cd, "cd_rel": Result.cd_rel}
+
+    @staticmethod
+    def materialize() -> int:
+        """
+        Analyzes the tests without a stored result for their own window and constants, returns
+        how many
+        """
+        missing = db.session.execute(
+            select(Test)
+            .outerjoin(Result, ResultService.own_result())
+            .where(Result.id == None)
+        ).scalars().all()
+        for test_entry in missing:
+            if test_entry.ufloat_vp1 == "not analyzed":
+                TestService.analyze(test_entry)
+        for test_entry, cd_dict in zip(missing, ResultService.batch(missing)):
+            key = (
+                test_entry.id,
+                test_entry.window_start,
+                test_entry.window_finish,
+                test_entry.constants_id,
+            )
+            ResultCache.put(key, cd_dict, test_entry.start, commit=False)
+        ResultCache.commit()
+        return len(missing)
+
+    @staticmethod
+    def own_result():
+        """Join condition of a test and its result, on the ResultCache key"""
+        return and_(
+            Result.test_id == Test.id,
+            Result.window_start == Test.window_start,
+            Result.window_finish == Test.window_finish,
+            Result.constants_id == Test.constants_id,
+        )
+
+    @staticmethod
+    def listing(
+        sort: str = "date", descending: bool = True, after: str = None, limit: int = 50
+    ) -> tuple[list, str]:
+        """
+        Returns a page of (Test, Result) rows ordered by a SORTS column and test id, and the
+        cursor of the next page (None on the last page)
+        Only reads stored results, they are added by warm after a test is saved or its window set
+        Pages are keyset paginated: after is the json [value, test_id] of the previous page's
+        last row, so every page is an index range scan however deep it is
+        Failed analyses (None) sort first ascending and last descending
+        """
+        column = ResultService.SORTS[sort]
+        query = select(Test, Result).join(Result, ResultService.own_result())
+        if after:
+            value, test_id = json.loads(after)
+            if descending:
+                query = query.where(
+                    or_(column < value, and_(column == value, Result.test_id < test_id), column == None)
+                    if value is not None
+                    else and_(column == None, Result.test_id < test_id)
+                )
+            else:
+                query = query.where(
+                    or_(column > value, and_(column == value, Result.test_id > test_id))
+                    if value is not None
+                    else or_(column != None, and_(column == None, Result.test_id > test_id))
+                )
+        if descending:
+            query = query.order_by(column.desc().nulls_last(), Result.test_id.desc())
+        else:
+            query = query.order_by(column.asc().nulls_first(), Result.test_id.asc())
+        rows = db.session.execute(query.limit(limit + 1)).all()
+        if len(rows) <= limit:
+            return rows, None
+        last = rows[limit - 1].Result
+        return rows[:limit], json.dumps([getattr(last, column.key), last.test_id])
+
+    @staticmethod
+    def format(n: float, s: float) -> str:
+        """Formats a value and uncertainty like the ufloat strings of cd_dict"""
+        return "N/A" if n is None else str(ufloat(n, s))
+
+    @staticmethod
+    def batch(tests: list[Test], constants: Constants = None) -> list:
+        """
+        Analyzes many tests in one vectorized kernels.cd_propagate call, against their own
+        constants or the given ones. Single tests are analyzed through it too
+        Returns a cd_dict, or the exception that stopped the analysis, per test, matching
+        propagate: UPC, UMF and readings come from the rounded ufloat strings like process_dict
+        """
+        x, u, calibration, errors = ResultService.inputs(tests, constants)
+        return ResultService.cd_dicts(x, u, calibration, errors)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def shown(n: float, s: float) -> tuple[str, float, float]:
+        """
+        Returns the ufloat string of n +/- s and the value and uncertainty it reads back as,
+        memoized since constants and sample periods repeat between tests
+        """
+        text = str(ufloat(n, s))
+        rounded = ufloat_fromstr(text)
+        return text, rounded.n, rounded.s
+
+    @staticmethod
+    def verify(cd_dict: dict, reference: dict, rel_tol: float = 1e-9) -> list[str]:
+        """
+        Compares a cd_dict to a reference one, such as batch to propagate, returns the
+        differences: entries whose strings differ or whose numbers are not within rel_tol
+        """
+        if isinstance(cd_dict, Exception) or isinstance(reference, Exception):
+            same = type(cd_dict) is type(reference)
+            return [] if same else [f"{cd_dict!r} != {reference!r}"]
+        differences = []
+        for key, values in reference.items():
+            if key == "summary":
+                continue
+            for i, (a, b) in enumerate(zip(cd_dict.get(key, []), values)):
+                if isinstance(b, str) or isinstance(a, str):
+                    ok = str(a) == str(b)
+                else:
+                    ok = math.isclose(a, b, rel_tol=rel_tol) or (math.isnan(a) and math.isnan(b))
+                if not ok:
+                    differences.append(f"{key}[{i}]: {a} != {b}")
+        return differences
+
+    @staticmethod
+    def cd_dicts(x: np.ndarray, u: np.ndarray, calibration: np.ndarray, errors: dict) -> list:
+        """
+        Given the inputs of tests as returned by inputs, returns their cd_dicts or exceptions
+        Needs no app or database, so it also runs in PoolService workers
+        All the arithmetic runs on the whole batch, the per test loop only formats ufloat
+        strings, which bounds it
+        """
+        # rounded inputs shown in cd_dict, with their strings
+        x_shown, u_shown = np.full(x.shape, np.nan), np.full(u.shape, np.nan)
+        shown = [None] * len(x)
+        as_shown = ResultService.shown
+
+        for i in range(len(x)):
+            if i in errors:
+                continue
+            shown[i] = [as_shown(a, b) for a, b in zip(x[i], u[i])]
+            x_shown[i] = [v[1] for v in shown[i]]
+            u_shown[i] = [v[2] for v in shown[i]]
+
+        r = kernels.cd_propagate(x, u, calibration)
+        cd_shown = [as_shown(cd, u_cd) for cd, u_cd in zip(r["cd"], r["u_cd"])]
+        upc, umf = kernels.upc_umf(
+            r["partials"],
+            x_shown,
+            u_shown,
+            np.array([v[1] for v in cd_shown]),
+            np.array([v[2] for v in cd_shown]),
+        )
+        # readings in inches and psi from the unrounded voltages, and the rounded ones shown
+        readings = ResultService.readings(x, u, calibration)
+        shown_readings = ResultService.readings(x_shown, u_shown, calibration)
+        summaries = ResultService.summaries(r["cd"], r["u_cd"], readings)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vdx_rel = np.where(x_shown[:, 4] > 0, u_shown[:, 4] / x_shown[:, 4] * 100, 100).tolist()
+        partials, upc, umf = r["partials"].tolist(), upc.tolist(), umf.tolist()
+        results = []
+        for i in range(len(x)):
+            if i in errors:
+                results.append(errors[i])
+            elif r["invalid"][i]:
+                results.append(ValueError("math domain error"))
+            elif not math.isfinite(r["cd"][i]):
+                results.append(ZeroDivisionError("float division by zero"))
+            else:
+                cd_dict = {"cd": [cd_shown[i][0], 1, "", 1, 1]}
+                for k, key in enumerate(kernels.VARIABLES):
+                    cd_dict[key] = [
+                        shown[i][k][0], partials[i][k], ResultService.UNITS[k], upc[i][k], umf[i][k]
+                    ]
+                dx, u_dx, p1, u_p1, p2, u_p2 = shown_readings[i]
+                cd_dict["vdx"] += [as_shown(dx, u_dx)[0], vdx_rel[i]]
+                cd_dict["vp1"].append(as_shown(p1, u_p1)[0])
+                cd_dict["vp2"].append(as_shown(p2, u_p2)[0])
+                cd_dict["summary"] = summaries[i]
+                results.append(cd_dict)
+        return results
+
+    # units of kernels.VARIABLES in cd_dict
+    UNITS = ("in", "in", "in", "kg/m3", "v", "s", "v", "v")
+
+    @staticmethod
+    def readings(x: np.ndarray, u: np.ndarray, calibration: np.ndarray) -> np.ndarray:
+        """
+        Given kernels inputs, returns (tests, 6) dx (in), P1 and P2 (psi) values and
+        uncertainties
+        """
+        p1_slope, p1_offset, p2_slope, p2_offset = calibration.T
+        return np.stack(
+            [
+                x[:, 4] * kernels.V2L,
+                u[:, 4] * kernels.V2L,
+                (x[:, 6] * kernels.V2P_SLOPE + kernels.V2P_OFFSET) * p1_slope + p1_offset,
+                np.abs(u[:, 6] * kernels.V2P_SLOPE * p1_slope),
+                (x[:, 7] * kernels.V2P_SLOPE + kernels.V2P_OFFSET) * p2_slope + p2_offset,
+                np.abs(u[:, 7] * kernels.V2P_SLOPE * p2_slope),
+            ],
+            axis=1,
+        )
+
+    @staticmethod
+    def reanalyze(constants_ids: list[int] = None, test_ids: list[int] = None) -> dict:
+        """
+        Analyzes every analyzed test, or the given ones, against every constants set, or the
+        given ones, and stores the results, for recalibrated transducers
+        Reuses the stored voltage statistics instead of the scans and skips stored results,
+        the (tests, constants) matrix is split in REANALYZE_CHUNK test chunks over the
+        process pool
+        Returns counts, seconds and results per second
+        """
+        t0 = time.perf_counter()
+        query = select(Test).where(Test.ufloat_vp1 != "not analyzed")
+        if test_ids is not None:
+            query = query.where(Test.id.in_(test_ids))
+        tests = db.session.execute(query.order_by(Test.id)).scalars().all()
+        query = select(Constants)
+        if constants_ids is not None:
+            query = query.where(Constants.id.in_(constants_ids))
+        constants = db.session.execute(query.order_by(Constants.id)).scalars().all()
+        stored = set(
+            tuple(row)
+            for row in db.session.execute(
+                select(
+                    Result.test_id, Result.window_start, Result.window_finish, Result.constants_id
+                ).where(Result.constants_id.in_([c.id for c in constants]))
+            ).all()
+        )
+
+        chunk = current_app.config["REANALYZE_CHUNK"]
+        keys, jobs = [], []
+        for c in constants:
+            todo = [t for t in tests if (t.id, t.window_start, t.window_finish, c.id) not in stored]
+            x, u, calibration, errors = ResultService.inputs(todo, c)
+            for at in range(0, len(todo), chunk):
+                keys.append(
+                    [
+                        (t.id, t.window_start, t.window_finish, c.id, t.start)
+                        for t in todo[at : at + chunk]
+                    ]
+                )
+                jobs.append(
+                    (
+                        x[at : at + chunk],
+                        u[at : at + chunk],
+                        calibration[at : at + chunk],
+                        {i - at: e for i, e in errors.items() if at <= i < at + chunk},
+                    )
+                )
+        computed = failed = 0
+        results = PoolService.map(ResultService.cd_dicts, *zip(*jobs)) if jobs else []
+        for chunk_keys, chunk_results in zip(keys, results):
+            for (*key, start), cd_dict in zip(chunk_keys, chunk_results):
+                ResultCache.put(tuple(key), cd_dict, start, commit=False)
+                computed += 1
+                failed += isinstance(cd_dict, Exception)
+        ResultCache.commit()
+
+        seconds = time.perf_counter() - t0
+        report = {
+            "tests": len(tests),
+            "constants": len(constants),
+            "computed": computed,
+            "failed": failed,
+            "skipped": len(tests) * len(constants) - computed,
+            "seconds": seconds,
+            "per_second": computed / seconds if seconds else 0,
+        }
+        console.print(
+            f"Reanalyzed {len(tests)} tests x {len(constants)} constants: {computed} results "
+            f"({failed} failed, {report['skipped']} already stored) in {seconds:.2f} s "
+            f"({report['per_second']:.0f} results/second)"
+        )
+        return report
+
+    @staticmethod
+    def inputs(tests: list[Test], constants: Constants = None) -> tuple:
+        """
+        Returns the kernels inputs of tests, against their own constants or the given ones:
+        x, u (tests, len(kernels.VARIABLES)), calibration (tests, 4) and the exception of
+        every test that cannot be analyzed by index, whose rows are NaN
+        """
+        if constants is None:
+            ids = {t.constants_id for t in tests}
+            by_id = {
+                c.id: c
+                for c in db.session.execute(
+                    select(Constants).where(Constants.id.in_(ids))
+                ).scalars()
+            }
+        n = len(kernels.VARIABLES)
+        x, u = np.full((len(tests), n), np.nan), np.full((len(tests), n), np.nan)
+        calibration = np.full((len(tests), 4), np.nan)
+        errors = {}
+        for i, t in enumerate(tests):
+            c = constants if constants is not None else by_id[t.constants_id]
+            try:
+                measured = [ufloat_fromstr(v) for v in (t.ufloat_vdx, t.ufloat_vp1, t.ufloat_vp2)]
+            except ValueError as e:
+                # test not analyzed yet
+                errors[i] = e
+                continue
+            vdx, vp1, vp2 = measured
+            period = 1 / t.scan_rate_actual
+            x[i] = (c.piston_avg, c.pipe_avg, c.orifice_avg, c.rho_avg, vdx.n, period, vp1.n, vp2.n)
+            u[i] = (
+                c.piston_uncertainty,
+                c.pipe_uncertainty,
+                c.orifice_uncertainty,
+                c.rho_uncertainty,
+                vdx.s,
+                kernels.dt_uncertainty(period),
+                vp1.s,
+                vp2.s,
+            )
+            calibration[i] = (c.p1_slope, c.p1_offset, c.p2_slope, c.p2_offset)
+        return x, u, calibration, errors
+
+    @staticmethod
+    def monte_carlo(test_id: int, constants_id: int = None, seed: int = None) -> dict:
+        """
+        Monte Carlo Cd uncertainty: every input is drawn from a normal distribution with its
+        ufloat value and uncertainty, in chunks of MC_CHUNK samples spread over the process pool
+        Rounds of MC_CHUNKS_PER_ROUND chunks run until the 95% interval moves by less than
+        MC_TOLERANCE of its half width, or MC_MAX_SAMPLES is reached
+        Chunk k is seeded from (seed, k), so a seed reproduces the result on any worker count
+        Returns the Cd median, mean, std, 95% interval and sampling details, with the linear
+        propagation of the same inputs and its 95% interval for comparison, or an exception
+        """
+        config = current_app.config
+        test_entry = db.session.get(Test, test_id)
+        constants = db.session.get(
+            Constants, test_entry.constants_id if constants_id is None else constants_id
+        )
+        x, u, calibration, errors = ResultService.inputs([test_entry], constants)
+        if errors:
+            return errors[0]
+        seed = config["MC_SEED"] if seed is None else seed
+        chunk, per_round = config["MC_CHUNK"], config["MC_CHUNKS_PER_ROUND"]
+
+        t0 = time.perf_counter()
+        chunks, interval, converged = [], None, False
+        while not converged and len(chunks) * chunk < config["MC_MAX_SAMPLES"]:
+            seeds = [
+                np.random.SeedSequence(seed, spawn_key=(k,))
+                for k in range(len(chunks), len(chunks) + per_round)
+            ]
+            chunks += PoolService.map(
+                kernels.cd_samples,
+                itertools.repeat(x[0]),
+                itertools.repeat(u[0]),
+                itertools.repeat(calibration[0]),
+                itertools.repeat(chunk),
+                seeds,
+            )
+            samples = np.concatenate(chunks)
+            valid = samples[np.isfinite(samples)]
+            if not len(valid):
+                return ValueError("No Monte Carlo sample gave a finite Cd")
+            lo, median, hi = np.percentile(valid, [2.5, 50, 97.5])
+            if interval is not None:
+                moved = max(abs(lo - interval[0]), abs(hi - interval[1]))
+                converged = moved <= config["MC_TOLERANCE"] * (hi - lo) / 2
+            interval = (lo, hi)
+        return {
+            "cd": median,
+            "mean": valid.mean(),
+            "std": valid.std(),
+            "lo": lo,
+            "hi": hi,
+            "samples": len(samples),
+            "invalid": len(samples) - len(valid),
+            "converged": converged,
+            "seed": seed,
+            "seconds": time.perf_counter() - t0,
+            "linear": ResultService.linear_interval(x[0], u[0], calibration[0]),
+        }
+
+    @staticmethod
+    def linear_interval(x, u, calibration) -> dict:
+        """Linearly propagated Cd and u_cd of one test's inputs, and the 95% interval +/- 1.96 u_cd"""
+        r = kernels.cd_propagate(x, u, calibration)
+        cd, u_cd = float(r["cd"]), float(r["u_cd"])
+        return {"cd": cd, "u_cd": u_cd, "lo": cd - 1.96 * u_cd, "hi": cd + 1.96 * u_cd}
+
+    # nominal test for planning, from UncertaintyPropagation.m: piston rate (in/s), transducer
+    # pressures (psi), voltage stdevs of the pressure readings and of the per-sample
+    # potentiometer difference (two readings of 0.00011 / sqrt(2) V)
+    PLAN_DEFAULT = {
+        "piston_rate": 2.89,
+        "p1": 50.0,
+        "p2": 6.0,
+        "u_vp1": 0.0017,
+        "u_vp2": 0.0021,
+        "u_vdx": 0.00011,
+    }
+
+    @staticmethod
+    def plan_reference(constants: Constants) -> dict:
+        """
+        Returns the reference a plan is predicted from, with PLAN_DEFAULT keys: from the latest
+        analyzed test with a moving piston, or PLAN_DEFAULT when there is none
+        """
+        test_entry = db.session.execute(
+            select(Test)
+            .where(Test.ufloat_vp1 != "not analyzed")
+            .order_by(Test.id.desc())
+            .limit(1)
+        ).scalar()
+        if test_entry is not None:
+            try:
+                vdx, vp1, vp2 = (
+                    ufloat_fromstr(v)
+                    for v in (test_entry.ufloat_vdx, test_entry.ufloat_vp1, test_entry.ufloat_vp2)
+                )
+            except ValueError:
+                vdx = None
+            if vdx is not None and vdx.n > 0:
+                to_psi = lambda v, p: (
+                    (v * kernels.V2P_SLOPE + kernels.V2P_OFFSET) * getattr(constants, f"{p}_slope")
+                    + getattr(constants, f"{p}_offset")
+                )
+                return {
+                    "piston_rate": vdx.n * test_entry.scan_rate_actual * kernels.V2L,
+                    "p1": to_psi(vp1.n, "p1"),
+                    "p2": to_psi(vp2.n, "p2"),
+                    "u_vp1": vp1.s,
+                    "u_vp2": vp2.s,
+                    "u_vdx": vdx.s,
+                    "test_id": test_entry.id,
+                }
+        return dict(ResultService.PLAN_DEFAULT, test_id=None)
+
+    @staticmethod
+    def plan(scan_rates: np.ndarray = None, constants: Constants = None, reference: dict = None) -> dict:
+        """
+        Predicts Cd and its uncertainty for every scan rate, like UncertaintyPropagation.m
+        The potentiometer moves piston_rate / scan_rate per sample while its noise stays put,
+        and the sample period uncertainty follows the T7 clock, so slow rates lose to the clock
+        and fast rates to the potentiometer
+        Defaults to a 2 ** (n / 4) grid up to the highest autotune rate, the active constants
+        and plan_reference, the whole grid is one kernels.cd_propagate call
+        Returns scan rates, cd, u_cd, relative u_cd and UPC (rates, len(kernels.VARIABLES)),
+        or None without constants and no active ones
+        """
+        if constants is None:
+            constants = db.session.execute(
+                select(Constants).where(Constants.is_active == True)
+            ).scalar()
+            if constants is None:
+                return None
+        if reference is None:
+            reference = ResultService.plan_reference(constants)
+        if scan_rates is None:
+            top = min(
+                current_app.config["AUTOTUNE_MAX_RATE"],
+                ChannelService.MAX_SAMPLE_RATE // len(ChannelService.DEFAULT),
+            )
+            scan_rates = 2 ** np.arange(0, np.log2(top) + 1e-9, 0.25)
+        scan_rates = np.asarray(scan_rates, float)
+        period = 1 / scan_rates
+        to_volts = lambda psi, p: (
+            ((psi - getattr(constants, f"{p}_offset")) / getattr(constants, f"{p}_slope")
+             - kernels.V2P_OFFSET) / kernels.V2P_SLOPE
+        )
+
+        n = len(scan_rates)
+        x = np.column_stack(
+            [
+                np.full(n, constants.piston_avg),
+                np.full(n, constants.pipe_avg),
+                np.full(n, constants.orifice_avg),
+                np.full(n, constants.rho_avg),
+                reference["piston_rate"] / kernels.V2L * period,
+                period,
+                np.full(n, to_volts(reference["p1"], "p1")),
+                np.full(n, to_volts(reference["p2"], "p2")),
+            ]
+        )
+        u = np.column_stack(
+            [
+                np.full(n, constants.piston_uncertainty),
+                np.full(n, constants.pipe_uncertainty),
+                np.full(n, constants.orifice_uncertainty),
+                np.full(n, constants.rho_uncertainty),
+                np.full(n, reference["u_vdx"]),
+                kernels.dt_uncertainty(period),
+                np.full(n, reference["u_vp1"]),
+                np.full(n, reference["u_vp2"]),
+            ]
+        )
+        calibration = (constants.p1_slope, constants.p1_offset, constants.p2_slope, constants.p2_offset)
+        result = kernels.cd_propagate(x, u, calibration)
+        return {
+            "scan_rates": scan_rates,
+            "cd": result["cd"],
+            "u_cd": result["u_cd"],
+            "u_rel": result["u_cd"] / result["cd"],
+            "upc": result["upc"],
+            "reference": reference,
+        }
+
+    @staticmethod
+    def warm(test_id: int = None) -> threading.Thread:
+        """
+        Analyzes a test, or every test without a stored result (materialize), in a background
+        thread so its result page and the test list are served from stored results
+        """
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                if test_id is None:
+                    ResultService.materialize()
+                else:
+                    ResultService.analyze(test_id)
+
+        thread = threading.Thread(
+            target=run, name=f"warm-result-{test_id or 'all'}", daemon=True
+        )
+        thread.start()
+        return thread
+
+    @staticmethod
+    def propagate(test_entry: Test, constants: Constants) -> dict:
+        """
+        Propagates the test's ufloats and the constants' uncertainties to Cd with unit-checked
+        pint quantities, the reference batch is verified against (CD_VERIFY)
+        Returns cd_dict, or the exception raised while calculating Cd
+        """
+
+        d, d1, d2, rho = ConstantsService.get_vars(constants)
+        try:
+            dx, p1, p2 = ResultService.get_vars(test_entry, constants)
+        except ValueError as e:
+            # test not analyzed yet
+            return e
+        readings = [q.magnitude for q in (dx.to("in"), p1.to("psi"), p2.to("psi"))]
+
+        # add linearity and hysteresis
+        p1.s = (p1.s**2 + (p1.n * 0.000697) ** 2 + (p1.n * 0.000436) ** 2) ** (1 / 2)
+        p2.s = (p2.s**2 + (p1.n * 0.000226) ** 2 + (p1.n * 0.000635) ** 2) ** (1 / 2)
+        sample_period = 1 / test_entry.scan_rate_actual
+        dt = ufloat(sample_period, (sample_period * 267) ** (1 / 2) * 1.6552e-8) * ur.s
+        try:
+            cd = (
+                4
+                * (d / 2) ** 2
+                * (dx / dt)
+                / (d2**2 * (2 * (p1 - p2) / (rho * (1 - (d2 / d1) ** 4))) ** (1 / 2))
+            )
+        except Exception as e:
+            return e
+
+        #  { key : [ ufloat_str: x+/-ux, partial wrt cd: ∂Cd/∂x, unit ] }
+        cd_dict = {
+            "cd": [str(cd.magnitude), 1, ""],
+            "d": [
+                str(d.to("in").magnitude),
+                cd.derivatives[next(iter(d.derivatives))],
+                "in",
+            ],
+            "d1": [
+                str(d1.to("in").magnitude),
+                cd.derivatives[next(iter(d1.derivatives))],
+                "in",
+            ],
+            "d2": [
+                str(d2.to("in").magnitude),
+                cd.derivatives[next(iter(d2.derivatives))],
+                "in",
+            ],
+            "rho": [
+                str(rho.magnitude),
+                cd.derivatives[next(iter(rho.derivatives))],
+                "kg/m3",
+            ],
+            "vdx": [
+                str(*dx.derivatives.keys()),
+                cd.derivatives[next(iter(dx.derivatives))],
+                "v",
+            ],
+            "dt": [str(dt.magnitude), cd.derivatives[next(iter(dt.derivatives))], "s"],
+            "vp1": [
+                str(*p1.derivatives.keys()),
+                cd.derivatives[next(iter(p1.derivatives))],
+                "v",
+            ],
+            "vp2": [
+                str(*p2.derivatives.keys()),
+                cd.derivatives[next(iter(p2.derivatives))],
+                "v",
+            ],
+        }
+        ResultService.process_dict(cd_dict, constants)
+        cd_dict["summary"] = ResultService.summary(
+            cd.magnitude.n, cd.magnitude.s, *(v for r in readings for v in (r.n, r.s))
+        )
+        return cd_dict
+
+    @staticmethod
+    def v2p(v: Quantity, p: str, c: Constants) -> Quantity:
+        """
+        Given voltage, transducer designator (p1 or p2), and constants entry, returns pressure quantity_ufloat
+        """
+        return (
+            (
+                (v / (20 * 5.9 * ur.ohm) - 0.004 * ur.A)
+                * (200 * ur.psi)
+                / (0.016 * ur.A)
+                * getattr(c, f"{p}_slope")
+                + getattr(c, f"{p}_offset") * ur.psi
+            )
+        ).to("Pa")
+
+    @staticmethod
+    def v2l(v: Quantity) -> Quantity:
+        """Given voltage, return distance quantity_ufloat"""
+        return (v * 7.853 * ur.inch / ur.V).to("m")
+
+        
+    @staticmethod
+    def process_dict(cd_dict: dict, c: Constants) -> None:
+        """
+        Adds UPC and UMF values to cd_dict, as well as actual reading values from voltages
+        UPC = (dCd/dx * ux/ucd) **2
+        UMF = (dCd/dx * x/cd)
+        """
+        u_cd = ufloat_fromstr(cd_dict["cd"][0])
+        for key, lis in cd_dict.items():
+            u_val = ufloat_fromstr(lis[0])
+            if key != "cd":
+                upc = (lis[1] * u_val.s / u_cd.s) ** 2
+                cd_dict[key].append(upc)
+                umf = lis[1] * u_val.n / u_cd.n
+                cd_dict[key].append(umf)
+                if key == "vp1" or key == "vp2":
+                    cd_dict[key].append(
+                        ResultService.v2p(u_val * ur.V, key[1:], c).to("psi").m)
+                elif key == 'vdx':
+                    cd_dict[key].extend(
+                        [ResultService.v2l(u_val * ur.V).to("in").m,
+                        u_val.s/u_val.n *100 if u_val.n > 0 else 100])
+            else:
+                cd_dict[key].extend([1, 1])
+
+
+
+    @staticmethod
+    def series(test_id: int, width: int = None, stride: int = None, constants_id: int = None) -> dict:
+        """
+        Time-resolved Cd: Cd and u_cd over every window of width scans, stepped by stride
+        scans, each analyzed like TestService.analyze with kernels.cd_propagate
+        Window statistics come from the test's StatsIndex, constant time per window, so the
+        scans are never loaded
+        Width and stride default to CD_SERIES_WIDTH_S and CD_SERIES_STRIDE_S, width is capped
+        at the test length and stride raised so there are at most CD_SERIES_MAX_WINDOWS
+        windows, series are stored in the cd_window table and read back from it
+        Returns window start and finish scans, center times (s), cd and u_cd, NaN where
+        undefined, or a ValueError for a width or stride under 1
+        """
+        test_entry = db.session.get(Test, test_id)
+        if constants_id is None:
+            constants_id = test_entry.constants_id
+        rate = test_entry.scan_rate_actual
+        if width is None:
+            width = round(current_app.config["CD_SERIES_WIDTH_S"] * rate)
+        elif width < 1:
+            return ValueError(f"Cd series width must be at least 1 scan, not {width}")
+        if stride is None:
+            stride = round(current_app.config["CD_SERIES_STRIDE_S"] * rate)
+        elif stride < 1:
+            return ValueError(f"Cd series stride must be at least 1 scan, not {stride}")
+        # dx needs two scans per window
+        index = StatsService.index(test_entry)
+        length = index.count
+        width = max(min(int(width), length), 2)
+        windows = current_app.config["CD_SERIES_MAX_WINDOWS"]
+        stride = max(int(stride), 1, -(-(length - width + 1) // windows))
+
+        key = (
+            (CdWindow.test_id == test_id)
+            & (CdWindow.constants_id == constants_id)
+            & (CdWindow.width == width)
+            & (CdWindow.stride == stride)
+        )
+        rows = db.session.execute(
+            select(CdWindow.start, CdWindow.finish, CdWindow.cd, CdWindow.cd_u)
+            .where(key)
+            .order_by(CdWindow.start)
+        ).all()
+        if rows:
+            start, finish, cd, cd_u = (np.array(c, dtype=float) for c in zip(*rows))
+        else:
+            names = index.names[: -len(StatsService.DERIVED)]
+            col = ChannelService.columns(db.session.get(Ljconfig, test_entry.ljconfig_id), names)
+            c = db.session.get(Constants, constants_id)
+            start = np.arange(0, length - width + 1, stride)
+            vp1, vp1_std = index.stats(start, start + width, col["p1"])
+            vp2, vp2_std = index.stats(start, start + width, col["p2"])
+            # a window of width scans holds width - 1 differences
+            vdx, vdx_std = index.stats(start, start + width - 1, index.names.index("dx"))
+            n = len(start)
+            period = 1 / rate
+            constant = lambda v: np.full(n, v)
+            x = np.column_stack(
+                [
+                    constant(c.piston_avg),
+                    constant(c.pipe_avg),
+                    constant(c.orifice_avg),
+                    constant(c.rho_avg),
+                    vdx,
+                    constant(period),
+                    vp1,
+                    vp2,
+                ]
+            )
+            u = np.column_stack(
+                [
+                    constant(c.piston_uncertainty),
+                    constant(c.pipe_uncertainty),
+                    constant(c.orifice_uncertainty),
+                    constant(c.rho_uncertainty),
+                    vdx_std,
+                    constant(kernels.dt_uncertainty(period)),
+                    vp1_std,
+                    vp2_std,
+                ]
+            )
+            result = kernels.cd_propagate(
+                x, u, (c.p1_slope, c.p1_offset, c.p2_slope, c.p2_offset)
+            )
+            finish = start + width
+            cd = np.where(np.isfinite(result["cd"]), result["cd"], np.nan)
+            cd_u = np.where(np.isfinite(result["u_cd"]), result["u_cd"], np.nan)
+            if n:
+                finite = lambda v: float(v) if np.isfinite(v) else None
+                db.session.execute(
+                    insert(CdWindow),
+                    [
+                        {
+                            "start": int(s),
+                            "finish": int(f),
+                            "width": width,
+                            "stride": stride,
+                            "cd": finite(v),
+                            "cd_u": finite(vu),
+                            "test_id": test_id,
+                            "constants_id": constants_id,
+                        }
+                        for s, f, v, vu in zip(start, finish, cd, cd_u)
+                    ],
+                )
+                db.session.commit()
+            start, finish = start.astype(float), finish.astype(float)
+        cd = np.array(cd, dtype=float)
+        cd_u = np.array(cd_u, dtype=float)
+        return {
+            "start": start,
+            "finish": finish,
+            "t": (start + finish) / 2 / rate,
+            "cd": cd,
+            "cd_u": cd_u,
+            "width": width,
+            "stride": stride,
+            "constants_id": constants_id,
+        }
+
+    @staticmethod
+    def series_image(test_id: int, series: dict) -> str:
+        """Plots a time-resolved Cd series with its uncertainty band, returns the image path"""
+        series_img = f"/static/results/{test_id}_{series['constants_id']}_{series['width']}_{series['stride']}_cd_t.png"
+        if RenderService.exists(series_img):
+            return series_img
+
+        t = db.session.get(Test, test_id)
+        # Cd blows up while the valve opens, scale to the windows inside the analysis window
+        inside = (series["start"] >= t.window_start) & (series["finish"] <= t.window_finish)
+        typical = series["cd"][inside & np.isfinite(series["cd"])]
+        if not len(typical):
+            typical = series["cd"][np.isfinite(series["cd"])]
+        ylim = None
+        if len(typical) and np.median(typical) > 0:
+            ylim = 2 * float(np.median(typical))
+        bounds = (t.window_start / t.scan_rate_actual, t.window_finish / t.scan_rate_actual)
+        return RenderService.render(series_img, plots.cd_series, series, bounds, ylim)
+
+    @staticmethod
+    def get_images(cd_dict: dict, test_id: int, const_id: int = None) -> str:
+        t = db.session.get(Test, test_id)
+        percentage_img = f"/static/results/{test_id}_{t.window_start}_{t.window_finish}_{t.constants_id if const_id is None else const_id}_uPer.png"
+        return RenderService.render(
+            percentage_img,
+            plots.uncertainty,
+            [key for key in cd_dict.keys() if key != "cd"],
+            [float(lis[3]) for key, lis in cd_dict.items() if key != "cd"],
+        )
@@ -0,0 +1,166 @@
+from app.extensions import db
+from app.models import StreamRead, Scan
+
+from sqlalchemy import select, update, and_, func, bindparam
+
+import json, struct
+import numpy as np
+
+
+class ScanService:
+    """
+    Packs scans as one interleaved array per stream read and loads them back as numpy arrays
+    Block layout: b"SDS1", uint16 header length, json header {dtype, channels}, raw samples
+    Scans are (scans, channels) arrays in scan list order, any number of channels
+    """
+
+    MAGIC = b"SDS1"
+    DTYPE = "<f8"
+    # channels of the fixed Scan table columns, other scan lists are always stored as blocks
+    ROW_CHANNELS = ["AIN0", "AIN1", "AIN2"]
+
+    @staticmethod
+    def pack(data, channels: list[str], dtype: str = DTYPE) -> bytes:
+        """Given interleaved samples (as returned by eStreamRead) and channel names, returns a scan block"""
+        header = json.dumps({"dtype": dtype, "channels": channels}).encode()
+        return (
+            ScanService.MAGIC
+            + struct.pack("<H", len(header))
+            + header
+            + np.asarray(data, dtype=dtype).tobytes()
+        )
+
+    @staticmethod
+    def unpack(block: bytes) -> tuple[np.ndarray, list[str]]:
+        """Given a scan block, returns a read-only (scans, channels) view of it and the channel names"""
+        if block[:4] != ScanService.MAGIC:
+            raise ValueError("Not a scan block")
+        (header_len,) = struct.unpack_from("<H", block, 4)
+        header = json.loads(block[6 : 6 + header_len])
+        channels = header["channels"]
+        data = np.frombuffer(block, dtype=header["dtype"], offset=6 + header_len)
+        return data.reshape(-1, len(channels)), channels
+
+    @staticmethod
+    def load(test_id: int) -> tuple[np.ndarray, list[str]]:
+        """Returns all scans of a test as a (scans, channels) array and the channel names"""
+        return ScanService.window(test_id)
+
+    @staticmethod
+    def length(test_id: int) -> int:
+        """Returns the number of scans in a test"""
+        return db.session.execute(
+            select(func.coalesce(func.sum(StreamRead.scan_count), 0)).where(
+                StreamRead.test_id == test_id
+            )
+        ).scalar_one()
+
+    @staticmethod
+    def window(
+        test_id: int, start: int = 0, finish: int = None, step: int = 1
+    ) -> tuple[np.ndarray, list[str]]:
+        """
+        Returns scans start, start + step, ... up to finish (exclusive) of a test as a
+        (scans, channels) array, and the channel names
+        Only the stream reads overlapping the window are fetched and every block is copied
+        straight into the output, so memory scales with the window rather than the test
+        """
+        length = ScanService.length(test_id)
+        finish = length if finish is None else min(finish, length)
+        start = max(start, 0)
+        overlapping = and_(
+            StreamRead.test_id == test_id,
+            StreamRead.first_sample < finish,
+            StreamRead.first_sample + StreamRead.scan_count > start,
+        )
+        size = max(0, -(-(finish - start) // step))
+
+        reads = db.session.execute(
+            select(StreamRead.first_sample, StreamRead.scan_count, StreamRead.data)
+            .where(overlapping)
+            .order_by(StreamRead.first_sample)
+        ).all()
+        if not reads or reads[0].data is not None:
+            channels = ScanService.channels(test_id)
+            out = np.empty((size, len(channels)))
+            filled = 0
+            for first, count, data in reads:
+                scans = ScanService.unpack(data)[0]
+                # first scan of this read on the start + k * step grid
+                g0 = max(start, first)
+                g0 += -(g0 - start) % step
+                g1 = min(finish, first + count)
+                if g0 >= g1:
+                    continue
+                block = scans[g0 - first : g1 - first : step]
+                k = (g0 - start) // step
+                out[k : k + len(block)] = block
+                filled = max(filled, k + len(block))
+            return out[:filled], channels
+
+        # Scan rows, the sample index is contiguous from 0 so the stride is applied in SQL
+        condition = and_(Scan.sample_i >= start, Scan.sample_i < finish)
+        if step > 1:
+            condition = and_(condition, (Scan.sample_i - start) % step == 0)
+        rows = db.session.execute(
+            select(Scan.ain0, Scan.ain1, Scan.ain2)
+            .join(StreamRead, Scan.stream_read_id == StreamRead.id)
+            .where(overlapping, condition)
+            .order_by(Scan.sample_i)
+        ).all()
+        return np.array(rows, dtype="f8").reshape(-1, 3), ScanService.ROW_CHANNELS
+
+    @staticmethod
+    def channels(test_id: int) -> list[str]:
+        """Returns the channel names stored with a test's scans"""
+        block = db.session.execute(
+            select(StreamRead.data).where(StreamRead.test_id == test_id).limit(1)
+        ).scalar_one_or_none()
+        if block is None:
+            return ScanService.ROW_CHANNELS
+        return ScanService.unpack(block)[1]
+
+    @staticmethod
+    def backfill() -> None:
+        """Indexes the scans of tests saved before the per-test sample index"""
+        conn = db.session.connection()
+        test_ids = db.session.execute(
+            select(StreamRead.test_id).where(StreamRead.first_sample == None).distinct()
+        ).scalars().all()
+        for test_id in test_ids:
+            reads = db.session.execute(
+                select(StreamRead.id, StreamRead.data)
+                .where(StreamRead.test_id == test_id)
+                .order_by(StreamRead.stream_i)
+            ).all()
+            if all(r.data is not None for r in reads):
+                counts = [len(ScanService.unpack(r.data)[0]) for r in reads]
+            else:
+                scan_ids = db.session.execute(
+                    select(Scan.stream_read_id, Scan.id)
+                    .join(StreamRead, Scan.stream_read_id == StreamRead.id)
+                    .where(StreamRead.test_id == test_id)
+                    .order_by(StreamRead.stream_i, Scan.id)
+                ).all()
+                per_read = {}
+                for stream_read_id, _ in scan_ids:
+                    per_read[stream_read_id] = per_read.get(stream_read_id, 0) + 1
+                counts = [per_read.get(r.id, 0) for r in reads]
+                if scan_ids:
+                    conn.execute(
+                        update(Scan.__table__)
+                        .where(Scan.__table__.c.id == bindparam("b_id"))
+                        .values(sample_i=bindparam("b_sample_i")),
+                        [{"b_id": scan_id, "b_sample_i": i} for i, (_, scan_id) in enumerate(scan_ids)],
+                    )
+            firsts = np.cumsum([0] + counts[:-1])
+            conn.execute(
+                update(StreamRead.__table__)
+                .where(StreamRead.__table__.c.id == bindparam("b_id"))
+                .values(first_sample=bindparam("b_first"), scan_count=bindparam("b_count")),
+                [
+                    {"b_id": r.id, "b_first": int(first), "b_count": count}
+                    for r, first, count in zip(reads, firsts, counts)
+                ],
+            )
+        db.session.commit()
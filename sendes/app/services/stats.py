@@ -0,0 +1,285 @@
+from app.extensions import db
+from app.models import Ljconfig, Test, StreamRead
+from app.stats import StatsIndex
+from app.pyramid import Pyramid
+from app.services.channels import ChannelService
+from app.services.scans import ScanService
+
+from sqlalchemy import select
+from flask import current_app
+
+import os, glob, json, struct
+from datetime import datetime
+import numpy as np
+
+
+class StatsService:
+    """
+    Statistics of stored tests without their samples: window mean and std from a StatsIndex
+    per test, whole test mean and std from the Welford aggregates of its stream reads
+    """
+
+    # columns computed from the channels, after them in the index and pyramid of a test
+    DERIVED = ["dx", "dp"]
+
+    @staticmethod
+    def path(test_entry: Test, extension: str = "idx") -> str:
+        """
+        Returns the path of a test's file in STATS_DIR, named after the test id and start
+        time so a test reusing the id of a deleted one never reads its file
+        """
+        start = datetime.fromisoformat(test_entry.start)
+        return os.path.join(
+            current_app.config["STATS_DIR"],
+            f"{test_entry.id}_{start:%Y%m%dT%H%M%S%f}.{extension}",
+        )
+
+    @staticmethod
+    def cached(test_entry: Test, extension: str, open_file):
+        """
+        Opens a test's file in STATS_DIR with open_file, returns None when it is missing or
+        does not hold the scans its header counts, after removing the files of the test id
+        Files are only built from saved tests, save_test discards them when it adds scans
+        """
+        path = StatsService.path(test_entry, extension)
+        if os.path.exists(path):
+            try:
+                return open_file(path)
+            except ValueError:
+                pass
+        StatsService.discard(test_entry.id, extension)
+        return None
+
+    @staticmethod
+    def discard(test_id: int, extension: str = "*") -> None:
+        """Removes the files of a test id in STATS_DIR, of every kind by default"""
+        stats_dir = current_app.config["STATS_DIR"]
+        for stale in glob.glob(os.path.join(stats_dir, f"{test_id}_*.{extension}")) + glob.glob(
+            os.path.join(stats_dir, f"{test_id}.{extension}")
+        ):
+            os.remove(stale)
+
+    @staticmethod
+    def index(test_entry: Test) -> StatsIndex:
+        """
+        Opens the stats index of a test, building it from the scans on first use, and
+        rebuilding indexes from before a DERIVED column was added
+        Columns are the channels and the DERIVED columns
+        """
+        index = StatsService.cached(test_entry, "idx", StatsService.open_index)
+        if index is not None:
+            return index
+        path = StatsService.path(test_entry)
+        scans, names = ScanService.load(test_entry.id)
+        col = ChannelService.columns(db.session.get(Ljconfig, test_entry.ljconfig_id), names)
+        # the last scan has no next one, a zero difference keeps the sums finite
+        x = scans[:, col["x"]]
+        values = StatsService.columns(scans, col, x[-1] if len(x) else np.nan)
+        return StatsIndex.create(path, values, names + StatsService.DERIVED)
+
+    @staticmethod
+    def open_index(path: str) -> StatsIndex:
+        """Opens an index file, raises ValueError unless its last columns are the DERIVED ones"""
+        index = StatsIndex.open(path)
+        if index.names[-len(StatsService.DERIVED) :] != StatsService.DERIVED:
+            raise ValueError(f"{path} does not index {StatsService.DERIVED}")
+        return index
+
+    @staticmethod
+    def columns(scans: np.ndarray, col: dict, following: float = np.nan) -> np.ndarray:
+        """
+        Returns (scans, channels) voltages with the DERIVED columns appended: dx the difference
+        from each position sample to the next, following being the position of the scan after
+        the last one if any, and dp the P1 minus P2 voltage
+        """
+        dx = StatsService.dx(scans[:, col["x"]], following)
+        dp = scans[:, col["p1"]] - scans[:, col["p2"]]
+        return np.column_stack([scans, dx, dp])
+
+    @staticmethod
+    def dx(x: np.ndarray, following: float = np.nan) -> np.ndarray:
+        """Differences from each position sample to the next, the last one to following"""
+        return np.diff(x, append=following)
+
+    @staticmethod
+    def window(test_entry: Test, start: int, finish: int) -> tuple:
+        """
+        Returns the mean and std of every channel over scans start to finish (exclusive), the
+        mean and std of the position differences within the window and the channel names
+        """
+        index = StatsService.index(test_entry)
+        channels = index.width - len(StatsService.DERIVED)
+        avg, std = index.stats(start, finish, slice(0, channels))
+        # a window of scans start to finish holds differences start to finish - 1
+        dx_avg, dx_std = index.stats(start, finish - 1, channels)
+        return avg, std, float(dx_avg), float(dx_std), index.names[:channels]
+
+    @staticmethod
+    def aggregate(samples: np.ndarray) -> np.ndarray:
+        """Returns the Welford count, mean and M2 of every channel of (scans, channels) samples"""
+        samples = np.asarray(samples, dtype="f8")
+        mean = samples.mean(axis=0) if len(samples) else np.zeros(samples.shape[1])
+        m2 = ((samples - mean) ** 2).sum(axis=0)
+        return np.stack([np.full(samples.shape[1], float(len(samples))), mean, m2])
+
+    @staticmethod
+    def combine(aggregates) -> np.ndarray:
+        """Merges (3, channels) Welford aggregates with Chan's parallel update"""
+        a = np.asarray(aggregates, dtype="f8")
+        count = a[:, 0].sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = (a[:, 0] * a[:, 1]).sum(axis=0) / count
+        m2 = a[:, 2].sum(axis=0) + (a[:, 0] * (a[:, 1] - mean) ** 2).sum(axis=0)
+        return np.stack([count, mean, m2])
+
+    @staticmethod
+    def summary(test_id: int) -> dict:
+        """
+        Returns {channel: (mean, std)} over a whole test from its stream reads' aggregates,
+        or None when a read has none
+        """
+        blobs = db.session.execute(
+            select(StreamRead.stats)
+            .where(StreamRead.test_id == test_id)
+            .order_by(StreamRead.first_sample)
+        ).scalars().all()
+        if not blobs or any(b is None for b in blobs):
+            return None
+        count, mean, m2 = StatsService.combine(
+            [np.frombuffer(b, dtype="<f8").reshape(3, -1) for b in blobs]
+        )
+        std = np.sqrt(m2 / count)
+        return dict(zip(ScanService.channels(test_id), zip(mean.tolist(), std.tolist())))
+
+
+class PyramidService:
+    """
+    Min/max decimated views of stored tests from a Pyramid per test, so plots and data
+    requests cost about the same for any test length
+    Columns are the channels and the StatsService.DERIVED columns
+    """
+
+    # scans read per chunk when building a pyramid from the stored scans
+    CHUNK = 1 << 16
+
+    @staticmethod
+    def pyramid(test_entry: Test) -> Pyramid:
+        """
+        Opens the pyramid of a test, save_test builds it, tests saved without one or whose
+        file was deleted build it from the stored scans on first use
+        """
+        pyramid = StatsService.cached(test_entry, "pyr", Pyramid.open)
+        if pyramid is not None:
+            return pyramid
+        count = ScanService.length(test_entry.id)
+        step = PyramidService.CHUNK
+        return PyramidService.build(
+            test_entry,
+            count,
+            ScanService.channels(test_entry.id),
+            (ScanService.window(test_entry.id, at, at + step)[0] for at in range(0, count, step)),
+        )
+
+    @staticmethod
+    def build(test_entry: Test, count: int, names: list[str], chunks) -> Pyramid:
+        """
+        Builds the pyramid of a test's count scans of the named channels, given in order as
+        (scans, channels) chunks, so only a chunk and the pyramid are held at a time
+        """
+        col = ChannelService.columns(db.session.get(Ljconfig, test_entry.ljconfig_id), names)
+        pyramid = Pyramid.create(
+            StatsService.path(test_entry, "pyr"),
+            count,
+            names + StatsService.DERIVED,
+            current_app.config["PYRAMID_FACTOR"],
+        )
+        # a chunk waits for the next one, whose first position ends its last dx
+        previous = None
+        for scans in chunks:
+            if not len(scans):
+                continue
+            if previous is not None:
+                pyramid.append(StatsService.columns(previous, col, scans[0, col["x"]]))
+            previous = scans
+        if previous is not None:
+            pyramid.append(StatsService.columns(previous, col))
+        pyramid.close()
+        return pyramid
+
+    @staticmethod
+    def view(test_entry: Test, start: int = 0, finish: int = None, points: int = None) -> dict:
+        """
+        Returns scans start to finish at the coarsest level with at least points bins
+        (PLOT_POINTS by default): the level, scans per bin, column names, the first scan of
+        every bin and the (bins, columns) min and max, equal for level 0 samples
+        """
+        pyramid = PyramidService.pyramid(test_entry)
+        finish = pyramid.count if finish is None else min(finish, pyramid.count)
+        start = min(max(start, 0), finish)
+        points = points or current_app.config["PLOT_POINTS"]
+        k = pyramid.level(start, finish, points)
+        if k:
+            first, bins = pyramid.read(k, start, finish)
+            size = pyramid.factor**k
+            lo, hi = bins[:, 0], bins[:, 1]
+        else:
+            # one scan past the window for its last dx
+            scans, names = ScanService.window(test_entry.id, start, min(finish + 1, pyramid.count))
+            col = ChannelService.columns(db.session.get(Ljconfig, test_entry.ljconfig_id), names)
+            values = StatsService.columns(scans, col)[: finish - start]
+            values = np.where(values == -9999.0, np.nan, values)
+            first, size, lo, hi = start, 1, values, values
+        return {
+            "level": k,
+            "bin": size,
+            "names": pyramid.names,
+            "index": first + size * np.arange(len(lo)),
+            "min": lo,
+            "max": hi,
+        }
+
+    @staticmethod
+    def data(test_entry: Test, start: int = 0, finish: int = None, points: int = None) -> tuple[dict, dict]:
+        """
+        Returns what a client needs to plot a view of scans start to finish, and the view:
+        level, scans per bin, first scan of the bins, bin count, the scan range and rate,
+        column names, channel columns by role and the window markers
+        """
+        count = PyramidService.pyramid(test_entry).count
+        finish = count if finish is None else min(finish, count)
+        start = min(max(start, 0), finish)
+        view = PyramidService.view(test_entry, start, finish, points)
+        names = view["names"]
+        meta = {
+            "level": view["level"],
+            "bin": view["bin"],
+            "first": int(view["index"][0]) if len(view["index"]) else start,
+            "bins": len(view["index"]),
+            "start": start,
+            "finish": finish,
+            "count": count,
+            "scan_rate": test_entry.scan_rate_actual,
+            "names": names,
+            "roles": ChannelService.columns(
+                db.session.get(Ljconfig, test_entry.ljconfig_id), names[:-2]
+            ),
+            "window": [test_entry.window_start, test_entry.window_finish],
+            "auto_window": (
+                None
+                if test_entry.auto_window_start is None
+                else [test_entry.auto_window_start, test_entry.auto_window_finish]
+            ),
+        }
+        return meta, view
+
+    @staticmethod
+    def packed(meta: dict, view: dict) -> bytes:
+        """
+        Packs a view for binary clients: the little-endian uint32 length of the JSON meta,
+        the meta padded with spaces to a multiple of 4 bytes, then the (2, columns, bins)
+        min and max as little-endian float32, NaN where a bin has no samples
+        """
+        data = json.dumps(meta).encode()
+        data += b" " * (-len(data) % 4)
+        values = np.stack([view["min"].T, view["max"].T]).astype("<f4")
+        return struct.pack("<I", len(data)) + data + values.tobytes()
@@ -0,0 +1,747 @@
+from app.extensions import db, console
+from app.models import Constants, Ljconfig, Test
+from app.devices import DeviceSession
+from app.spool import Spool
+from app.pyramid import Pyramid
+from app.services.cache import ResultCache
+from app.services.channels import ChannelService
+from app.services.database import dbService
+from app.services.devices import DeviceService
+from app.services.ljconfig import LjconfigService
+from app.services.stats import StatsService
+from app import kernels
+
+from sqlalchemy import select
+from flask import current_app
+
+import sys, os, gc, json, time, threading, queue
+from collections import deque
+from datetime import datetime
+import numpy as np
+from uncertainties import ufloat
+from labjack import ljm
+
+
+class Telemetry(threading.Thread):
+    """
+    Keeps per-read records in a fixed size ring and prints them from a background thread
+    at most once per interval, so terminal output never runs inside the stream loop
+    Nothing is printed when console output is disabled, records are stored with the stream reads
+    """
+
+    DTYPE = [
+        ("stream_i", "i8"),
+        ("host_time", "f8"),
+        ("lj_backlog", "i8"),
+        ("ljm_backlog", "i8"),
+        ("skipped", "f8"),
+        ("loop_s", "f8"),
+    ]
+
+    def __init__(self, console_output: bool, interval: float, capacity: int = 1024):
+        super().__init__(name="telemetry", daemon=True)
+        self.console_output = console_output
+        self.interval = interval
+        self.ring = np.zeros(capacity, dtype=self.DTYPE)
+        self.head = 0  # records written
+        self.flushed = 0  # records printed
+        self.messages = queue.SimpleQueue()
+        self.stopped = threading.Event()
+
+    def record(self, stream_i, host_time, lj_backlog, ljm_backlog, skipped, loop_s):
+        self.ring[self.head % len(self.ring)] = (
+            stream_i,
+            host_time,
+            lj_backlog,
+            ljm_backlog,
+            skipped,
+            loop_s,
+        )
+        self.head += 1
+
+    def log(self, message: str, style: str = "magenta"):
+        if self.console_output:
+            self.messages.put((message, style))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        while not self.messages.empty():
+            message, style = self.messages.get()
+            console.print(message, style=style)
+        head = self.head
+        if head == self.flushed:
+            return
+        dropped = max(0, head - self.flushed - len(self.ring))
+        first = max(self.flushed, head - len(self.ring))
+        records = self.ring[np.arange(first, head) % len(self.ring)]
+        self.flushed = head
+        console.print(
+            f"\neStreamRead {records['stream_i'][0]}-{records['stream_i'][-1]}"
+            f"\nScans Skipped = {records['skipped'].sum()}, Max Scan Backlogs: Device = {records['lj_backlog'].max()}, "
+            f"LJM = {records['ljm_backlog'].max()}, Max Loop = {records['loop_s'].max() * 1000:.2f} ms"
+            + (f"\n{dropped} records dropped" if dropped else ""),
+            style="magenta",
+        )
+
+    def start(self):
+        if self.console_output:
+            super().start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+
+
+class SpoolService:
+    @staticmethod
+    def path(start: datetime) -> str:
+        """Returns the spool file path of a test started at start"""
+        return os.path.join(
+            current_app.config["SPOOL_DIR"], f"{start:%Y%m%dT%H%M%S%f}.spool"
+        )
+
+    @staticmethod
+    def recover() -> list[Test]:
+        """
+        Saves every spool left by an interrupted test as a Test and removes the spool
+        Tests that did not finish streaming keep finish = "test incomplete"
+        """
+        spool_dir = current_app.config["SPOOL_DIR"]
+        if not os.path.isdir(spool_dir):
+            return []
+        recovered = []
+        for name in sorted(os.listdir(spool_dir)):
+            if not name.endswith(".spool"):
+                continue
+            spool = Spool.open(os.path.join(spool_dir, name))
+            reads = spool.committed
+            meta = spool.meta
+            if reads == 0:
+                spool.delete()
+                continue
+
+            records = spool.records[:reads]
+            # a save interrupted between chunks resumes on the test it already stored
+            test_entry = db.session.get(Test, meta["test_id"]) if "test_id" in meta else None
+            test_entry = test_entry or Test(
+                start=meta["start"],
+                finish=meta.get("finish", "test incomplete"),
+                duration=meta.get(
+                    "duration",
+                    str(
+                        records["host_time"][-1]
+                        - datetime.fromisoformat(meta["start"]).timestamp()
+                    ),
+                ),
+                scan_rate_actual=meta["scan_rate_actual"],
+                window_start=meta["window_start"],
+                window_finish=meta["window_finish"],
+                ufloat_vp1="not analyzed",
+                ufloat_vp2="not analyzed",
+                ufloat_vdx="not analyzed",
+                ljconfig_id=meta["ljconfig_id"],
+                constants_id=meta["constants_id"],
+                acquisition_stats=json.dumps({"recovered_reads": reads}),
+            )
+            channels = len(meta["channels"])
+            test_entry.pending_channels = meta["channels"]
+            test_entry.pending_reads = []
+            for r in records:
+                samples = spool.samples[r["stream_i"] - 1, : r["count"]]
+                test_entry.pending_reads.append(
+                    {
+                        "stream_i": int(r["stream_i"]),
+                        "skipped": np.count_nonzero(samples == -9999.0) / channels,
+                        "lj_backlog": int(r["lj_backlog"]),
+                        "ljm_backlog": int(r["ljm_backlog"]),
+                        "host_time": float(r["host_time"]),
+                        "loop_s": float(r["loop_s"]),
+                        "samples": samples,
+                    }
+                )
+            test_entry.spool = spool
+            dbService.save_test(test_entry)
+            console.print(
+                f"Recovered test {test_entry.id} from {name} ({reads} reads)",
+                style="orange_red1",
+            )
+            recovered.append(test_entry)
+        return recovered
+
+
+class LiveFeed:
+    """
+    Fans stream frames out to server-sent event clients while a test runs
+    Every client has its own bounded buffer, a slow client loses its oldest frames
+    instead of holding up the stream. Publishing only queues the event data, read frames
+    carry a view of their spool row and are decimated and serialized by each client's
+    response thread, never by the acquisition thread
+    """
+
+    lock = threading.Lock()
+    clients = []
+
+    @staticmethod
+    def active() -> bool:
+        return bool(LiveFeed.clients)
+
+    @staticmethod
+    def publish(event: str, data: dict) -> None:
+        """
+        Queues an event for every client without blocking
+        A "scans" (scans, channels) array in data is sent as its min/max decimation
+        """
+        if not LiveFeed.clients:
+            return
+        with LiveFeed.lock:
+            for client in LiveFeed.clients:
+                if len(client["buffer"]) == client["buffer"].maxlen:
+                    client["dropped"] += 1
+                client["buffer"].append((event, data))
+                client["ready"].set()
+
+    @staticmethod
+    def message(event: str, data: dict, points: int) -> str:
+        if "scans" in data:
+            data = {k: v for k, v in data.items() if k != "scans"} | LiveFeed.decimate(
+                data["scans"], points
+            )
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    @staticmethod
+    def events(maxlen: int, points: int, keepalive: float = 15):
+        """
+        Yields server-sent event messages for one client until it disconnects
+        Read frames are decimated to at most points bins here, on the client's thread
+        """
+        client = {"buffer": deque(maxlen=maxlen), "ready": threading.Event(), "dropped": 0}
+        with LiveFeed.lock:
+            LiveFeed.clients.append(client)
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                if not client["ready"].wait(keepalive):
+                    yield ": keepalive\n\n"
+                    continue
+                with LiveFeed.lock:
+                    client["ready"].clear()
+                    messages = list(client["buffer"])
+                    client["buffer"].clear()
+                    dropped, client["dropped"] = client["dropped"], 0
+                if dropped:
+                    yield f"event: dropped\ndata: {dropped}\n\n"
+                yield "".join(LiveFeed.message(event, data, points) for event, data in messages)
+        finally:
+            with LiveFeed.lock:
+                LiveFeed.clients.remove(client)
+
+    @staticmethod
+    def decimate(scans: np.ndarray, points: int) -> dict:
+        """
+        Given (scans, channels) voltages, returns per channel min and max over at most points bins
+        Binned like the plot pyramids, skipped (-9999) samples are left out, bins with no samples are None
+        """
+        size = max(1, -(-len(scans) // points))
+        bins = Pyramid.bin(scans, scans, size)
+        as_list = lambda a: [None if v != v else round(v, 6) for v in a.tolist()]
+        return {
+            "bin": size,
+            "min": [as_list(ch) for ch in bins[:, 0].T],
+            "max": [as_list(ch) for ch in bins[:, 1].T],
+        }
+
+
+class StreamReader(threading.Thread):
+    """
+    Drains eStreamRead into a bounded queue so decoding and persistence never stall the device
+    Each read is copied into its preallocated spool row and committed before it is queued
+    Queue items are (stream_i, sample_count, lj_backlog, ljm_backlog), None marks the end of the stream
+    """
+
+    def __init__(
+        self,
+        device,
+        handle: int,
+        spool: Spool,
+        live: bool,
+        maxsize: int,
+        telemetry: Telemetry,
+        sync_reads: int = 0,
+    ):
+        super().__init__(name="stream-reader", daemon=True)
+        self.device = device
+        self.telemetry = telemetry
+        self.handle = handle
+        self.spool = spool
+        self.read_count = spool.read_count
+        self.live = live
+        self.sync_reads = sync_reads  # reads between spool msyncs, 0 never syncs
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stopped = threading.Event()
+        self.error = None
+        self.reads = 0
+        self.read_s = 0.0  # time spent inside eStreamRead
+        self.wait_s = 0.0  # time blocked on a full queue
+        self.elapsed_s = 0.0  # time from the first read to the end of the last
+        # net GC tracked allocations of the read and copy steps, over the reads without a
+        # collection in between, the collection resets the count
+        self.allocations = 0
+        self.allocation_reads = 0
+        self.collections = 0
+
+    def run(self):
+        gc.callbacks.append(self.collected)
+        start = time.perf_counter()
+        try:
+            for i in range(1, self.read_count + 1):
+                if self.stopped.is_set():
+                    break
+                t0 = time.perf_counter()
+                # stop test
+                if i == self.read_count and self.live:
+                    self.device.eWriteName(self.handle, "DAC0", 0)
+                    self.telemetry.log("valve closed")
+
+                collections = self.collections
+                gen0 = gc.get_count()[0]
+                aData, ljScanBacklog, ljmScanBacklog = self.device.eStreamRead(self.handle)
+                host_time = time.time()
+                t1 = time.perf_counter()
+                count = len(aData)
+                self.spool.samples[i - 1, :count] = aData
+                del aData
+                t2 = time.perf_counter()
+                self.spool.records[i - 1] = (
+                    i,
+                    ljScanBacklog,
+                    ljmScanBacklog,
+                    count,
+                    host_time,
+                    t2 - t0,
+                )
+                self.spool.commit(
+                    i,
+                    sync=self.sync_reads > 0
+                    and (i % self.sync_reads == 0 or i == self.read_count),
+                )
+                if self.collections == collections:
+                    self.allocations += gc.get_count()[0] - gen0
+                    self.allocation_reads += 1
+                self.put((i, count, ljScanBacklog, ljmScanBacklog))
+                self.read_s += t1 - t0
+                self.wait_s += time.perf_counter() - t2
+                self.reads = i
+        except Exception:
+            self.error = sys.exc_info()[1]
+        finally:
+            self.elapsed_s = time.perf_counter() - start
+            gc.callbacks.remove(self.collected)
+            self.put(None)
+
+    def collected(self, phase: str, info: dict):
+        if phase == "start":
+            self.collections += 1
+
+    def stats(self) -> dict:
+        """
+        Returns reads per second, loop latency percentiles and allocations per read over the
+        completed reads
+        Allocations are the growth of the GC generation 0 count over the read and copy steps,
+        the count is shared by all threads, so it includes what the consumer allocated meanwhile
+        """
+        loop_ms = self.spool.records["loop_s"][: self.reads] * 1000
+        if not self.reads:
+            return {}
+        p50, p90, p99 = np.percentile(loop_ms, [50, 90, 99])
+        return {
+            "reads_per_s": self.reads / self.elapsed_s if self.elapsed_s else 0.0,
+            "loop_ms_p50": p50,
+            "loop_ms_p90": p90,
+            "loop_ms_p99": p99,
+            "loop_ms_max": loop_ms.max(),
+            "allocations_per_read": (
+                self.allocations / self.allocation_reads if self.allocation_reads else None
+            ),
+        }
+
+    def put(self, item):
+        """Blocks while the queue is full, gives up once the consumer has stopped the reader"""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class TestService:
+    @staticmethod
+    def get(test_id: int) -> Test:
+        test_entry = db.session.get(Test, test_id)
+        if test_entry is None:
+            return None
+        elif test_entry.ufloat_vp1 == "not analyzed":
+            TestService.analyze(test_entry)
+        return test_entry
+
+    @staticmethod
+    def execute(ljconfig: Ljconfig = None, live: bool = False) -> Test:
+        """
+        Runs a stream with the given or active ljconfig, opening the valve when live
+        Returns the unsaved test entry, or the exception that stopped the stream
+        """
+        telemetry = Telemetry(
+            current_app.config["CONSOLE_TELEMETRY"],
+            current_app.config["TELEMETRY_FLUSH_S"],
+        )
+        telemetry.start()
+        session = DeviceService.session()
+        try:
+            with session.lock:
+                return TestService.stream(ljconfig, live, telemetry, session)
+        finally:
+            telemetry.stop()
+
+    @staticmethod
+    def stream(
+        ljconfig: Ljconfig, live: bool, telemetry: Telemetry, session: DeviceSession
+    ) -> Test:
+        setup_start = time.perf_counter()
+        if ljconfig is None:
+            ljconfig = db.session.execute(
+                select(Ljconfig).where(Ljconfig.is_active == True)
+            ).scalar_one()
+        device = session.device
+        handle = session.open()
+        info = session.info
+        telemetry.log(
+            f"\nUsing a LabJack with Device type: {info[0]}, Connection type: {info[1]},\n"
+            f"Serial number: {info[2]}, IP address: {info[3]}, Port: {info[4]},\nMax bytes per MB: {info[5]}"
+        )
+
+        # Stream Configuration
+        channels = ljconfig.channels or ChannelService.default()
+        aScanListNames = [c.name for c in channels]  # Scan list names to stream
+        numAddresses = len(aScanListNames)
+        aScanList = session.scan_list(aScanListNames)
+
+        # ljm config
+        scanRate = ljconfig.scan_rate
+        scansPerRead = ljconfig.buffer_size
+        MAX_REQUESTS = ljconfig.read_count
+        # The number of eStreamRead calls that will be performed.
+
+        # All negative channels are single-ended, each channel's range comes from
+        # the ljconfig's channel table.
+        # When streaming, negative channels and ranges can be configured for
+        # individual analog inputs, but the stream has only one settling time and
+        # resolution.
+
+        # ljm config object creation
+        aConfig = {
+            # Ensure triggered stream is disabled.
+            "STREAM_TRIGGER_INDEX": 0,
+            # Enabling internally-clocked stream.
+            "STREAM_CLOCK_SOURCE": 0,
+            "AIN_ALL_NEGATIVE_CH": ljconfig.ain_all_negative_ch,
+            **ChannelService.registers(channels),
+            "STREAM_SETTLING_US": ljconfig.stream_settling_us,
+            "STREAM_RESOLUTION_INDEX": ljconfig.stream_resolution_index,
+        }
+
+        reader = None
+        try:
+            # lj stream config
+            # Write the stream trigger and clock, analog inputs' negative channels, ranges,
+            # stream settling time and stream resolution configuration, if changed.
+            registers_written = session.configure(aConfig)
+
+            # Configure and start stream
+            sync_1 = datetime.now()
+            scanRate = device.eStreamStart(
+                handle, scansPerRead, numAddresses, aScanList, scanRate
+            )
+            sync_2 = datetime.now()
+            start = sync_1 + (sync_2 - sync_1) / 2
+            setup_s = time.perf_counter() - setup_start
+
+            # start test
+            if live:
+                device.eWriteName(handle, "DAC0", 5)
+                telemetry.log("valve opened")
+
+            telemetry.log(
+                f"\nStream started with a scan rate of {scanRate:.2f} Hz."
+                f"\nPerforming {MAX_REQUESTS} stream reads.\n"
+            )
+
+            # initialize test db entry
+            w_start, w_finish = LjconfigService.get_default_window(ljconfig)
+            test_entry = Test(
+                start=start.isoformat(),
+                finish="test incomplete",
+                duration=0,
+                scan_rate_actual=0.0,
+                window_start=w_start,
+                window_finish=w_finish,
+                ufloat_vp1="not analyzed",
+                ufloat_vp2="not analyzed",
+                ufloat_vdx="not analyzed",
+                ljconfig_id=ljconfig.id,
+                constants_id=db.session.execute(
+                    select(Constants.id).where(Constants.is_active == True)
+                ).scalar_one(),
+            )
+            test_entry.pending_reads = []
+            test_entry.pending_channels = aScanListNames
+
+            # reader thread drains the device into the spool, this thread decodes and persists
+            # live tests are spooled to disk so a crash loses no committed read
+            spool = Spool.create(
+                SpoolService.path(start) if live else None,
+                {
+                    "start": test_entry.start,
+                    "scan_rate_actual": scanRate,
+                    "window_start": w_start,
+                    "window_finish": w_finish,
+                    "ljconfig_id": test_entry.ljconfig_id,
+                    "constants_id": test_entry.constants_id,
+                    "channels": aScanListNames,
+                },
+                MAX_REQUESTS,
+                scansPerRead * numAddresses,
+            )
+            test_entry.spool = spool
+            samples = spool.samples
+            reader = StreamReader(
+                device,
+                handle,
+                spool,
+                live,
+                current_app.config["READ_QUEUE_SIZE"],
+                telemetry,
+                current_app.config["SPOOL_SYNC_READS"] if live else 0,
+            )
+            LiveFeed.publish(
+                "start",
+                {
+                    "start": test_entry.start,
+                    "scan_rate": scanRate,
+                    "read_count": MAX_REQUESTS,
+                    "channels": aScanListNames,
+                    "live": live,
+                },
+            )
+            # no collections while streaming, the loop allocates little and pauses cost backlog
+            gc_enabled = current_app.config["STREAM_DISABLE_GC"] and gc.isenabled()
+            if gc_enabled:
+                gc.freeze()
+                gc.disable()
+            reader.start()
+
+            totScans = 0
+            totSkip = 0  # Total skipped samples
+            queue_depths = np.zeros(MAX_REQUESTS, dtype=np.int64)
+            consume_s = 0.0
+            try:
+                while (item := reader.queue.get()) is not None:
+                    t0 = time.perf_counter()
+                    i, count, ljScanBacklog, ljmScanBacklog = item
+                    queue_depth = reader.queue.qsize()
+                    queue_depths[i - 1] = queue_depth
+                    aData = samples[i - 1, :count]
+                    scans = count / numAddresses
+                    totScans += scans
+
+                    # Count the skipped samples which are indicated by -9999 values. Missed
+                    # samples occur after a device's stream buffer overflows and are
+                    # reported after auto-recover mode ends.
+                    curSkip = int(np.count_nonzero(aData == -9999.0))
+                    skipped = curSkip / numAddresses
+                    totSkip += curSkip
+
+                    # stream read row, inserted in bulk by dbService.save_test
+                    test_entry.pending_reads.append(
+                        {
+                            "stream_i": i,
+                            "skipped": skipped,
+                            "lj_backlog": ljScanBacklog,
+                            "ljm_backlog": ljmScanBacklog,
+                            "queue_depth": queue_depth,
+                            "host_time": spool.records["host_time"][i - 1],
+                            "loop_s": spool.records["loop_s"][i - 1],
+                            "samples": aData,
+                        }
+                    )
+                    telemetry.record(
+                        i,
+                        spool.records["host_time"][i - 1],
+                        ljScanBacklog,
+                        ljmScanBacklog,
+                        skipped,
+                        spool.records["loop_s"][i - 1],
+                    )
+                    if LiveFeed.active():
+                        LiveFeed.publish(
+                            "read",
+                            {
+                                "stream_i": i,
+                                "t0": (i - 1) * scansPerRead / scanRate,
+                                "dt": 1 / scanRate,
+                                "skipped": skipped,
+                                "lj_backlog": ljScanBacklog,
+                                "ljm_backlog": ljmScanBacklog,
+                                "scans": aData.reshape(-1, numAddresses),
+                            },
+                        )
+                    consume_s += time.perf_counter() - t0
+            finally:
+                if gc_enabled:
+                    gc.enable()
+                    gc.unfreeze()
+                LiveFeed.publish("end", {"reads": reader.reads})
+            if reader.error is not None:
+                raise reader.error
+
+            # update test entry
+            end = datetime.now()
+            tt = (end - start).seconds + float((end - start).microseconds) / 1000000
+            test_entry.finish = end.isoformat()
+            test_entry.duration = str(tt)
+            test_entry.scan_rate_actual = scanRate
+            spool.write_meta(spool.meta | {"finish": test_entry.finish, "duration": test_entry.duration})
+            spool.flush()
+            loop_stats = reader.stats()
+            test_entry.acquisition_stats = json.dumps(
+                {
+                    "setup_s": setup_s,
+                    "registers_written": registers_written,
+                    "queue_size": reader.queue.maxsize,
+                    "queue_depth_max": int(queue_depths.max()),
+                    "queue_depth_avg": float(queue_depths.mean()),
+                    "read_s": reader.read_s,
+                    "reader_wait_s": reader.wait_s,
+                    "consume_s": consume_s,
+                    **loop_stats,
+                }
+            )
+
+            telemetry.log(
+                f"\nTotal scans = {totScans}"
+                f"\nTime taken = {tt:.2f} seconds"
+                f"\nLJM Scan Rate = {scanRate:.1f} scans/second"
+                f"\nTimed Scan Rate = {totScans/tt:.2f} scans/second"
+                f"\nTimed Sample Rate = {totScans*numAddresses/tt:.1f} samples/second"
+                f"\nSkipped scans = {totSkip/numAddresses}"
+                f"\nMax queue depth = {queue_depths.max()}/{reader.queue.maxsize}"
+                f"\nRead stage = {reader.read_s:.2f} s, Consume stage = {consume_s:.2f} s"
+                f"\nReads/s = {loop_stats.get('reads_per_s', 0):.1f}"
+                f", read loop p50/p99 = {loop_stats.get('loop_ms_p50', 0):.2f}/{loop_stats.get('loop_ms_p99', 0):.2f} ms"
+                f", {loop_stats.get('allocations_per_read') or 0:.1f} allocations per read"
+            )
+
+        except ljm.LJMError:
+            ljme = sys.exc_info()[1]
+            if reader is not None:
+                reader.stop()
+            device.eWriteName(handle, "DAC0", 0)
+            console.print(f"valve closed\n {ljme}", style="orange_red1")
+            session.close()
+            return ljme
+        except Exception:
+            e = sys.exc_info()[1]
+            if reader is not None:
+                reader.stop()
+            device.eWriteName(handle, "DAC0", 0)
+            console.print(f"valve closed\n {e}", style="orange_red1")
+            session.close()
+            return e
+
+        try:
+            telemetry.log("\nStop Stream\n")
+            device.eStreamStop(handle)
+        except ljm.LJMError:
+            ljme = sys.exc_info()[1]
+            console.print(ljme, style="orange_red1")
+            session.close()
+            return ljme
+        except Exception:
+            e = sys.exc_info()[1]
+            console.print(e, style="orange_red1")
+            session.close()
+            return e
+
+        return test_entry
+
+    @staticmethod
+    def set_bounds(bound_form, test_id):
+        test_entry = db.session.get(Test, test_id)
+        bound_form.populate_obj(test_entry)
+        return TestService.analyze(test_entry, find_window=False)
+
+    @staticmethod
+    def find_window(test_entry: Test) -> Test:
+        """
+        Finds the steady flow window of a test with kernels.steady_window and makes it the
+        test window, stores it and its confidence, keeps the window when none is found
+        The pressure difference and piston speed are scored from the test's StatsIndex, the
+        scans are not loaded
+        """
+        config = current_app.config
+        index = StatsService.index(test_entry)
+        found = kernels.steady_window(
+            index.prefix(index.names.index("dp")),
+            index.prefix(index.names.index("dx")),
+            index.count,
+            noise_width=max(round(config["WINDOW_NOISE_S"] * test_entry.scan_rate_actual), 4),
+            grid=config["WINDOW_GRID"],
+            min_length=max(round(config["WINDOW_NOISE_S"] * test_entry.scan_rate_actual), 4),
+            min_confidence=config["WINDOW_MIN_CONFIDENCE"],
+        )
+        if found is None:
+            test_entry.window_confidence = 0.0
+        else:
+            start, finish, test_entry.window_confidence = found
+            test_entry.auto_window_start = test_entry.window_start = start
+            test_entry.auto_window_finish = test_entry.window_finish = finish
+        return test_entry
+
+    @staticmethod
+    def analyze(test_entry: Test, find_window: bool = None) -> Test:
+        """
+        Calculates ufloats for vp1, vp2, and vdx over window, saves to db and returns entry
+        The window is found first with find_window, by default on the first analysis
+        """
+        if find_window or find_window is None and test_entry.ufloat_vp1 == "not analyzed":
+            TestService.find_window(test_entry)
+        # window statistics from the test's prefix sums, constant time in the window size
+        avg, std, dx_avg, dx_std, names = StatsService.window(
+            test_entry, test_entry.window_start, test_entry.window_finish
+        )
+        col = ChannelService.columns(
+            db.session.get(Ljconfig, test_entry.ljconfig_id), names
+        )
+        ufloat_vp1 = ufloat(avg[col["p1"]], std[col["p1"]])
+        ufloat_vp2 = ufloat(avg[col["p2"]], std[col["p2"]])
+        ufloat_vdx = ufloat(dx_avg, dx_std)
+
+        ufloats = (str(ufloat_vp1), str(ufloat_vp2), str(ufloat_vdx))
+        if ufloats != (test_entry.ufloat_vp1, test_entry.ufloat_vp2, test_entry.ufloat_vdx):
+            # results stored at other windows stay valid, the scans never change
+            ResultCache.invalidate(
+                test_entry.id, test_entry.window_start, test_entry.window_finish
+            )
+        test_entry.ufloat_vp1, test_entry.ufloat_vp2, test_entry.ufloat_vdx = ufloats
+        db.session.add(test_entry)
+        db.session.commit()
+
+        return test_entry
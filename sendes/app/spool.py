@@ -0,0 +1,89 @@
+import struct
+
+import numpy as np
+
+from app.mapped import MappedFile
+
+
+class Spool(MappedFile):
+    """
+    Append-only, memory-mapped file holding a test while it streams
+
+    Layout: a 4096 byte header (magic, committed read count, json test metadata), one
+    record per read, then one row of interleaved samples per read. A read counts as
+    committed once its samples and record are written, so after a crash every committed
+    read can be recovered. Synced commits write the rows through to the disk before the
+    count, so they also survive a power loss. Without a path the spool lives in memory only.
+    """
+
+    MAGIC = b"SDSP"
+    RECORD = [
+        ("stream_i", "<i8"),
+        ("lj_backlog", "<i8"),
+        ("ljm_backlog", "<i8"),
+        ("count", "<i8"),
+        ("host_time", "<f8"),
+        ("loop_s", "<f8"),
+    ]
+
+    def __init__(self, path: str, buffer: np.ndarray, read_count: int, width: int):
+        super().__init__(path, buffer)
+        self.read_count = read_count
+        self.width = width
+        self.synced = 0  # reads written through to the disk
+        records_size = read_count * np.dtype(self.RECORD).itemsize
+        self.records = np.ndarray(
+            (read_count,), dtype=self.RECORD, buffer=buffer, offset=self.HEADER_SIZE
+        )
+        self.samples = np.ndarray(
+            (read_count, width),
+            dtype="<f8",
+            buffer=buffer,
+            offset=self.HEADER_SIZE + records_size,
+        )
+
+    @staticmethod
+    def size(read_count: int, width: int) -> int:
+        return Spool.HEADER_SIZE + read_count * (np.dtype(Spool.RECORD).itemsize + width * 8)
+
+    @classmethod
+    def create(cls, path: str, meta: dict, read_count: int, width: int) -> "Spool":
+        """Creates a spool for read_count reads of width samples, in memory when path is None"""
+        # written in place, the reads committed before a crash are recovered from it
+        buffer = cls.allocate(path, cls.size(read_count, width), staged=False)
+        struct.pack_into("<II", buffer, 4, read_count, width)
+        spool = cls(path, buffer, read_count, width)
+        spool.write_meta(meta)
+        return spool
+
+    @classmethod
+    def open(cls, path: str) -> "Spool":
+        """Opens an existing spool file"""
+        buffer = cls.map(path, mode="r+")
+        read_count, width = struct.unpack_from("<II", buffer, 4)
+        return cls(path, buffer, read_count, width)
+
+    @property
+    def committed(self) -> int:
+        """Number of reads fully written"""
+        return struct.unpack_from("<Q", self.buffer, 12)[0]
+
+    def commit(self, reads: int, sync: bool = False) -> None:
+        """Marks the first reads as committed, with sync only once their rows are on the disk"""
+        if sync:
+            itemsize = self.records.itemsize
+            self.sync(self.HEADER_SIZE + self.synced * itemsize, (reads - self.synced) * itemsize)
+            row = self.width * 8
+            first = self.HEADER_SIZE + self.read_count * itemsize
+            self.sync(first + self.synced * row, (reads - self.synced) * row)
+        struct.pack_into("<Q", self.buffer, 12, reads)
+        if sync:
+            self.sync(12, 8)
+            self.synced = reads
+
+    @property
+    def meta(self) -> dict:
+        return self.read_json(self.buffer, 20)
+
+    def write_meta(self, meta: dict) -> None:
+        self.write_json(self.buffer, 20, self.encode(meta, 20))
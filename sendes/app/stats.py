@@ -0,0 +1,76 @@
+import struct
+
+import numpy as np
+
+from app import kernels
+from app.mapped import MappedFile
+
+
+class StatsIndex(MappedFile):
+    """
+    Memory-mapped prefix sums of a test's samples, for the mean and std of any window in
+    constant time
+
+    Layout: a 4096 byte header (magic, scan count, column count, json column names, the
+    per column shift the sums are centered on), then prefix sums of the centered values and
+    of their squares, (scans + 1, columns) each. Only the two rows bounding a window are read.
+    """
+
+    MAGIC = b"SDSX"
+
+    def __init__(self, path: str, buffer: np.ndarray, count: int, width: int):
+        super().__init__(path, buffer)
+        self.count = count
+        self.width = width
+        self.names = self.read_json(buffer, 16)
+        self.shift = np.ndarray((width,), dtype="<f8", buffer=buffer, offset=2048)
+        size = (count + 1) * width * 8
+        self.sums = np.ndarray(
+            (count + 1, width), dtype="<f8", buffer=buffer, offset=self.HEADER_SIZE
+        )
+        self.squares = np.ndarray(
+            (count + 1, width), dtype="<f8", buffer=buffer, offset=self.HEADER_SIZE + size
+        )
+
+    @staticmethod
+    def size(count: int, width: int) -> int:
+        return StatsIndex.HEADER_SIZE + 2 * (count + 1) * width * 8
+
+    @classmethod
+    def create(cls, path: str, values: np.ndarray, names: list[str]) -> "StatsIndex":
+        """Indexes (scans, columns) values under the given column names, in memory when path is None"""
+        values = np.asarray(values, dtype="f8")
+        count, width = values.shape
+        # the shift is stored from byte 2048 of the header
+        data = cls.encode(names, 16, limit=2048)
+        if width * 8 > cls.HEADER_SIZE - 2048:
+            raise ValueError("StatsIndex metadata does not fit in the header")
+        buffer = cls.allocate(path, cls.size(count, width))
+        struct.pack_into("<QI", buffer, 4, count, width)
+        cls.write_json(buffer, 16, data)
+        index = cls(path, buffer, count, width)
+        kernels.prefix_sums(values, out=(index.shift, index.sums, index.squares))
+        index.publish()
+        return index
+
+    @classmethod
+    def open(cls, path: str) -> "StatsIndex":
+        """Opens an existing index file read only, raises ValueError unless it holds the scans its header counts"""
+        buffer = cls.map(path)
+        count, width = struct.unpack_from("<QI", buffer, 4)
+        if len(buffer) != cls.size(count, width):
+            raise ValueError(f"{path} does not hold {count} scans")
+        return cls(path, buffer, count, width)
+
+    def prefix(self, columns=slice(None)) -> tuple:
+        """The kernels.prefix_sums of the given columns, views of the mapped file"""
+        return self.shift[columns], self.sums[:, columns], self.squares[:, columns]
+
+    def stats(self, start, finish, columns=slice(None)) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the mean and std of values start to finish (exclusive) of the given columns,
+        NaN for an empty window, with kernels.segment_stats so arrays of windows work too
+        """
+        start = np.clip(start, 0, self.count)
+        finish = np.clip(finish, start, self.count)
+        return kernels.segment_stats(self.prefix(columns), start, finish)
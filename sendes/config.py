@@ -10,3 +10,78 @@ class Config:
     ) or "sqlite:///" + os.path.join(basedir, "app.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     TESTING = False
+    # "blob" packs each stream read into one array, "rows" keeps one Scan row per sample
+    SCAN_STORAGE = os.environ.get("SCAN_STORAGE") or "blob"
+    # max stream reads buffered between the reader thread and the consumer
+    READ_QUEUE_SIZE = int(os.environ.get("READ_QUEUE_SIZE") or 64)
+    # "ljm" streams from a connected T7, "sim" from a simulated one
+    LJ_BACKEND = os.environ.get("LJ_BACKEND") or "ljm"
+    # simulated T7: test id to replay instead of synthetic scans
+    SIM_REPLAY_TEST = os.environ.get("SIM_REPLAY_TEST")
+    # simulated T7: produce scans as fast as they are read instead of at the scan rate
+    SIM_MAX_SPEED = os.environ.get("SIM_MAX_SPEED", "0") == "1"
+    # simulated T7: chance per read of injecting a burst of -9999 skipped scans
+    SIM_SKIP_RATE = float(os.environ.get("SIM_SKIP_RATE") or 0)
+    # simulated T7: LJM backlog in scans past which scans are dropped
+    SIM_LJM_BUFFER_SCANS = int(os.environ.get("SIM_LJM_BUFFER_SCANS") or 100000)
+    # freeze and disable the garbage collector while a stream is running
+    STREAM_DISABLE_GC = os.environ.get("STREAM_DISABLE_GC", "1") == "1"
+    # print stream progress, at most once per TELEMETRY_FLUSH_S seconds
+    CONSOLE_TELEMETRY = os.environ.get("CONSOLE_TELEMETRY", "1") == "1"
+    TELEMETRY_FLUSH_S = float(os.environ.get("TELEMETRY_FLUSH_S") or 0.5)
+    # live tests are spooled here while streaming and recovered from here after a crash
+    SPOOL_DIR = os.environ.get("SPOOL_DIR") or os.path.join(basedir, "spool")
+    # spooled reads between msyncs of the spool, 0 leaves write back to the OS
+    SPOOL_SYNC_READS = int(os.environ.get("SPOOL_SYNC_READS") or 1)
+    # stream reads packed, inserted and committed together when a test is saved
+    SAVE_CHUNK_READS = int(os.environ.get("SAVE_CHUNK_READS") or 1000)
+    # prefix sum indexes and plot pyramids of stored tests
+    STATS_DIR = os.environ.get("STATS_DIR") or os.path.join(basedir, "stats")
+    # min/max plot pyramids: scans per bin growth between levels and the bins served when a
+    # data request does not ask for a number
+    PYRAMID_FACTOR = int(os.environ.get("PYRAMID_FACTOR") or 4)
+    PLOT_POINTS = int(os.environ.get("PLOT_POINTS") or 1000)
+    # live test events: frames buffered per client and min/max bins per stream read
+    LIVE_CLIENT_BUFFER = int(os.environ.get("LIVE_CLIENT_BUFFER") or 256)
+    LIVE_FRAME_POINTS = int(os.environ.get("LIVE_FRAME_POINTS") or 100)
+    # LJConfig autotune: seconds per probe stream, reads per second tried for each rate,
+    # backlog growth per read (in buffers) that counts as falling behind, bisection steps
+    # and the highest scan rate tried (T7 streams up to 100 kS/s over 3 channels), the search
+    # stops with the best rate found after at most AUTOTUNE_MAX_PROBES probes or AUTOTUNE_MAX_S
+    AUTOTUNE_PROBE_S = float(os.environ.get("AUTOTUNE_PROBE_S") or 2)
+    AUTOTUNE_READS_PER_S = (2, 4, 10)
+    AUTOTUNE_MAX_GROWTH = float(os.environ.get("AUTOTUNE_MAX_GROWTH") or 0.01)
+    AUTOTUNE_STEPS = int(os.environ.get("AUTOTUNE_STEPS") or 4)
+    AUTOTUNE_MAX_RATE = int(os.environ.get("AUTOTUNE_MAX_RATE") or 33333)
+    AUTOTUNE_MAX_PROBES = int(os.environ.get("AUTOTUNE_MAX_PROBES") or 20)
+    AUTOTUNE_MAX_S = float(os.environ.get("AUTOTUNE_MAX_S") or 60)
+    # Cd results kept in memory, least recently used are evicted
+    RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE") or 256)
+    # tests per page of the test list
+    TESTS_PAGE_SIZE = int(os.environ.get("TESTS_PAGE_SIZE") or 50)
+    # check every single test Cd against the unit-checked pint propagation and print differences
+    CD_VERIFY = os.environ.get("CD_VERIFY", "0") == "1"
+    # time-resolved Cd: window width and stride in seconds
+    CD_SERIES_WIDTH_S = float(os.environ.get("CD_SERIES_WIDTH_S") or 0.1)
+    CD_SERIES_STRIDE_S = float(os.environ.get("CD_SERIES_STRIDE_S") or 0.01)
+    # most windows per series, the stride is raised to stay under it
+    CD_SERIES_MAX_WINDOWS = int(os.environ.get("CD_SERIES_MAX_WINDOWS") or 2000)
+    # steady flow window finder: candidate window bounds per test, seconds per noise window
+    # and the least share of noise in a window's variance
+    WINDOW_GRID = int(os.environ.get("WINDOW_GRID") or 200)
+    WINDOW_NOISE_S = float(os.environ.get("WINDOW_NOISE_S") or 0.05)
+    WINDOW_MIN_CONFIDENCE = float(os.environ.get("WINDOW_MIN_CONFIDENCE") or 0.8)
+    # worker processes for CPU bound work such as Monte Carlo, 0 runs it in the request
+    WORKERS = int(os.environ.get("WORKERS") or os.cpu_count() or 1)
+    # worker processes rendering plot images, 0 renders them in the request
+    RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS") or 2)
+    # Monte Carlo Cd uncertainty: samples per chunk, chunks per convergence check, sample
+    # limit, 95% interval movement (fraction of its half width) that counts as converged,
+    # and the default seed
+    MC_CHUNK = int(os.environ.get("MC_CHUNK") or 100000)
+    MC_CHUNKS_PER_ROUND = int(os.environ.get("MC_CHUNKS_PER_ROUND") or 4)
+    MC_MAX_SAMPLES = int(os.environ.get("MC_MAX_SAMPLES") or 4000000)
+    MC_TOLERANCE = float(os.environ.get("MC_TOLERANCE") or 0.005)
+    MC_SEED = int(os.environ.get("MC_SEED") or 0)
+    # tests per process pool job when reanalyzing tests against other constants
+    REANALYZE_CHUNK = int(os.environ.get("REANALYZE_CHUNK") or 128)